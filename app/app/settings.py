@@ -9,6 +9,7 @@ https://docs.djangoproject.com/en/5.1/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
+from importlib.util import find_spec
 import os
 from pathlib import Path
 
@@ -80,6 +81,12 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "app.wsgi.application"
 
+# scripts/run.sh serves the app with uWSGI, or with uvicorn when
+# SERVER_MODE=asgi. Under ASGI the recipe, tag and ingredient reads run
+# as coroutines on the async ORM instead of holding a thread each.
+SERVER_MODE = os.environ.get('SERVER_MODE', 'wsgi')
+ASYNC_READ_VIEWS = SERVER_MODE == 'asgi'
+
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
@@ -91,16 +98,46 @@ WSGI_APPLICATION = "app.wsgi.application"
 #     }
 # }
 
+# Each worker keeps its connection for DB_CONN_MAX_AGE seconds, checked
+# with a ping before reuse, rather than connecting on every request.
+# DB_POOL_MAX_SIZE > 0 gives every worker process a psycopg pool of that
+# many connections instead. Under ASGI the request threads do not outlive
+# their request, so only the pool can reuse connections there. Keep
+# workers x pool size below the server's max_connections. Behind
+# pgbouncer in transaction mode set DB_PGBOUNCER=1, server side cursors
+# do not survive the end of a transaction there.
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', 0))
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.postgresql",
         "HOST": os.environ.get('DB_HOST'),
+        "PORT": os.environ.get('DB_PORT', ''),
         "NAME": os.environ.get('DB_NAME','devdb'),
         "USER": os.environ.get('DB_USER'),
         "PASSWORD": os.environ.get('DB_PASS'),
+        "CONN_MAX_AGE": (
+            0 if DB_POOL_MAX_SIZE or ASYNC_READ_VIEWS
+            else int(os.environ.get('DB_CONN_MAX_AGE', 60))
+        ),
+        "CONN_HEALTH_CHECKS": True,
+        "DISABLE_SERVER_SIDE_CURSORS": bool(
+            int(os.environ.get('DB_PGBOUNCER', 0))
+        ),
+        "OPTIONS": {
+            'connect_timeout': int(os.environ.get('DB_CONNECT_TIMEOUT', 5)),
+        },
     }
 }
 
+if DB_POOL_MAX_SIZE:
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 1)),
+        'max_size': DB_POOL_MAX_SIZE,
+        # Seconds a request waits for a free connection.
+        'timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -142,6 +179,22 @@ MEDIA_URL = "/static/media/"
 MEDIA_ROOT = '/vol/web/media'
 STATIC_ROOT = '/vol/web/static'
 
+# Uploaded recipe images are re-encoded by the background worker to fit
+# within this many pixels on the longest side.
+RECIPE_IMAGE_MAX_SIZE = int(os.environ.get('RECIPE_IMAGE_MAX_SIZE', 2048))
+RECIPE_IMAGE_QUALITY = int(os.environ.get('RECIPE_IMAGE_QUALITY', 85))
+# Unreferenced image files younger than this are kept, they may be about
+# to be referenced by a recipe that has not been committed yet.
+RECIPE_IMAGE_GRACE_SECONDS = int(
+    os.environ.get('RECIPE_IMAGE_GRACE_SECONDS', 3600)
+)
+# Widths of the resized variants generated once per recipe image.
+RECIPE_IMAGE_VARIANT_WIDTHS = [
+    int(width) for width in os.environ.get(
+        'RECIPE_IMAGE_VARIANT_WIDTHS', '160,320,640,1280'
+    ).split(',')
+]
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -151,9 +204,104 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 AUTH_USER_MODEL = 'core.User'
 
 
+# Caches
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+# The auth cache lives in shared memory so every uwsgi worker sees the
+# same token lookups, MAX_ENTRIES bounds it and TIMEOUT is the TTL.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'auth': {
+        'BACKEND': os.environ.get(
+            'AUTH_CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache',
+        ),
+        'LOCATION': os.environ.get(
+            'AUTH_CACHE_LOCATION', '/dev/shm/recipe-app-auth'
+        ),
+        'TIMEOUT': int(os.environ.get('AUTH_CACHE_TTL', 300)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('AUTH_CACHE_MAX_ENTRIES', 10000)),
+        },
+    },
+    # Serialized list responses, keyed on a per user data version.
+    'responses': {
+        'BACKEND': os.environ.get(
+            'RESPONSE_CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache',
+        ),
+        'LOCATION': os.environ.get(
+            'RESPONSE_CACHE_LOCATION', '/dev/shm/recipe-app-responses'
+        ),
+        'TIMEOUT': int(os.environ.get('RESPONSE_CACHE_TTL', 600)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(
+                os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 5000)
+            ),
+        },
+    },
+    # Hit, miss and connection counters. Kept out of the responses cache
+    # so culling never drops them and its directory scans stay small.
+    # Point it at Redis or Memcached to make the increments atomic, the
+    # file backend reads and rewrites the value and can lose a few under
+    # concurrent requests.
+    'stats': {
+        'BACKEND': os.environ.get(
+            'STATS_CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache',
+        ),
+        'LOCATION': os.environ.get(
+            'STATS_CACHE_LOCATION', '/dev/shm/recipe-app-stats'
+        ),
+        'TIMEOUT': None,
+    },
+}
+
+AUTH_TOKEN_CACHE = 'auth'
+RESPONSE_CACHE = 'responses'
+STATS_CACHE = 'stats'
+
+# Runs the tests against in-memory caches instead of the ones above.
+TEST_RUNNER = 'core.test_runner.LocMemCacheTestRunner'
+
+
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # orjson renders the same bytes as the stdlib JSON renderer, faster.
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
+# Clients may send and accept application/msgpack when the optional
+# msgpack package is installed.
+if find_spec('msgpack') is not None:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].append(
+        'core.renderers.MessagePackRenderer'
+    )
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'].append(
+        'core.parsers.MessagePackParser'
+    )
+
+# Cursor pagination of the recipe list, clients may ask for smaller or
+# larger pages with ?page_size= up to the maximum.
+RECIPE_PAGE_SIZE = int(os.environ.get('RECIPE_PAGE_SIZE', 25))
+RECIPE_MAX_PAGE_SIZE = int(os.environ.get('RECIPE_MAX_PAGE_SIZE', 100))
+
+# Largest number of recipes accepted by one bulk create request.
+RECIPE_BULK_MAX_ITEMS = int(os.environ.get('RECIPE_BULK_MAX_ITEMS', 1000))
+
+# Rows fetched per round trip, and per prefetch, by the NDJSON export.
+RECIPE_EXPORT_CHUNK_SIZE = int(
+    os.environ.get('RECIPE_EXPORT_CHUNK_SIZE', 500)
+)
 
 
 SPECTACULAR_SETTINGS ={
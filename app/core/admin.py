@@ -61,3 +61,6 @@ class RecipeDisplay(admin.ModelAdmin):
 admin.site.register(models.Recipe, RecipeDisplay)
 admin.site.register(models.Tag)
 admin.site.register(models.Ingredient)
+admin.site.register(models.RecipeImageUpload)
+admin.site.register(models.ImageVariantJob)
+admin.site.register(models.RecipeImport)
@@ -0,0 +1,79 @@
+''' Authentication classes shared by the API apps '''
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import router, transaction
+
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+def get_token_cache():
+    ''' Return the cache holding the token lookups '''
+    return caches[settings.AUTH_TOKEN_CACHE]
+
+
+def token_cache_key(key):
+    ''' Return the cache key for an auth token, never the raw token '''
+    return f'auth-token:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def forget_tokens(keys):
+    ''' Drop cached token lookups now and again once the write commits '''
+    cache_keys = [token_cache_key(key) for key in keys]
+    get_token_cache().delete_many(cache_keys)
+    if transaction.get_connection().in_atomic_block:
+        # Requests before the commit may have cached the old rows again.
+        transaction.on_commit(
+            lambda: get_token_cache().delete_many(cache_keys)
+        )
+
+
+def _cached_user_fields(user_model):
+    ''' Return the user columns kept in the cache, all but the password '''
+    return [
+        field.attname for field in user_model._meta.concrete_fields
+        if field.name != 'password'
+    ]
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication that caches the token to user lookup.
+
+    The cache is shared by all workers and entries expire after the
+    cache TIMEOUT. The signals in core.signals drop an entry as soon as
+    its token is deleted or its user is saved, so deactivated or edited
+    users are never served from the cache.
+
+    Entries are keyed on a hash of the token and hold the user's columns
+    without the password hash, plus the token's creation time. Neither the
+    raw token nor the password is written to the cache.
+    """
+
+    def authenticate_credentials(self, key):
+        ''' Return the (user, token) pair, from the cache when possible '''
+        cache = get_token_cache()
+        cache_key = token_cache_key(key)
+        cached = cache.get(cache_key)
+        if cached is None:
+            user, token = super().authenticate_credentials(key)
+            fields = _cached_user_fields(type(user))
+            cache.set(cache_key, {
+                'user': [getattr(user, name) for name in fields],
+                'created': token.created,
+            })
+            return user, token
+        user_model = get_user_model()
+        # The password is left deferred and loaded only if it is read.
+        user = user_model.from_db(
+            router.db_for_read(user_model),
+            _cached_user_fields(user_model), cached['user'],
+        )
+        token = Token.from_db(
+            router.db_for_read(Token), ['key', 'user_id', 'created'],
+            [key, user.pk, cached['created']],
+        )
+        token.user = user
+        return user, token
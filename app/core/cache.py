@@ -0,0 +1,86 @@
+''' Per user data versions, the shared API response cache and counters '''
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+STATS_KEYS = {
+    'hits': 'response-cache:hits',
+    'misses': 'response-cache:misses',
+    'bytes_served': 'response-cache:bytes-served',
+}
+
+
+def get_response_cache():
+    ''' Return the cache holding the API responses '''
+    return caches[settings.RESPONSE_CACHE]
+
+
+def get_stats_cache():
+    ''' Return the cache holding the shared counters '''
+    return caches[settings.STATS_CACHE]
+
+
+def _version_key(user_id):
+    ''' Return the cache key of a user's data version '''
+    return f'data-version:{user_id}'
+
+
+def get_data_version(user_id):
+    ''' Return the current data version of a user '''
+    cache = get_response_cache()
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock rather than zero, a culled or expired
+        # version can then never bring back responses cached under it.
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_data_version(user_id):
+    ''' Invalidate every cached response of a user in O(1) '''
+    get_response_cache().set(
+        _version_key(user_id), time.time_ns(), timeout=None
+    )
+
+
+def data_changed(user_id):
+    ''' Bump the user's version now and again once the write commits '''
+    bump_data_version(user_id)
+    if transaction.get_connection().in_atomic_block:
+        # Readers between the first bump and the commit may have cached
+        # the old rows under the new version.
+        transaction.on_commit(lambda: bump_data_version(user_id))
+
+
+def increment_counter(key, amount=1):
+    ''' Increment a shared counter, creating it when missing '''
+    cache = get_stats_cache()
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        cache.set(key, amount, timeout=None)
+
+
+def record_hit(size):
+    ''' Count a response served from the cache '''
+    increment_counter(STATS_KEYS['hits'])
+    increment_counter(STATS_KEYS['bytes_served'], size)
+
+
+def record_miss():
+    ''' Count a response that had to be built '''
+    increment_counter(STATS_KEYS['misses'])
+
+
+def get_stats():
+    ''' Return the response cache counters and hit ratio '''
+    values = get_stats_cache().get_many(STATS_KEYS.values())
+    stats = {name: values.get(key, 0) for name, key in STATS_KEYS.items()}
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+    return stats
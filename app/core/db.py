@@ -0,0 +1,38 @@
+''' Connection statistics of the default database '''
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .cache import get_stats_cache, increment_counter
+
+
+CONNECTIONS_KEY = 'database:connections-opened'
+
+
+def record_connection(connection):
+    ''' Count a connection opened outside of a pool '''
+    # Pooled connections are counted by the pool itself.
+    if getattr(connection, 'pool', None) is None:
+        increment_counter(CONNECTIONS_KEY)
+
+
+def get_stats(alias=DEFAULT_DB_ALIAS):
+    ''' Return the connection settings, connections opened and pool usage '''
+    connection = connections[alias]
+    settings_dict = connection.settings_dict
+    pooled = 'pool' in settings_dict['OPTIONS']
+    if pooled:
+        mode = 'pool'
+    elif settings_dict['CONN_MAX_AGE'] != 0:
+        mode = 'persistent'
+    else:
+        mode = 'per_request'
+    return {
+        'mode': mode,
+        'conn_max_age': settings_dict['CONN_MAX_AGE'],
+        'health_checks': settings_dict['CONN_HEALTH_CHECKS'],
+        'server_side_cursors': (
+            not settings_dict['DISABLE_SERVER_SIDE_CURSORS']
+        ),
+        'connections_opened': get_stats_cache().get(CONNECTIONS_KEY, 0),
+        # The pool, and so its counters, belong to the worker answering.
+        'pool': connection.pool.get_stats() if pooled else None,
+    }
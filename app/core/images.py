@@ -0,0 +1,228 @@
+''' Background processing of uploaded recipe images '''
+from datetime import timedelta
+from io import BytesIO
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from PIL import Image, ImageOps, features
+
+from .models import (
+    ImageVariantJob, Recipe, RecipeImageUpload, content_file_path,
+)
+
+
+def _claim_next(model, stale_after):
+    ''' Mark the oldest waiting job of a queue as processing and return it
+
+    Jobs left in processing for longer than stale_after seconds by a
+    crashed worker are claimed again.
+    '''
+    stale = timezone.now() - timedelta(seconds=stale_after)
+    with transaction.atomic():
+        job = model.objects.select_for_update(
+            skip_locked=True
+        ).filter(
+            Q(status=RecipeImageUpload.PENDING)
+            | Q(status=RecipeImageUpload.PROCESSING, updated_at__lt=stale)
+        ).order_by('updated_at').first()
+        if job is None:
+            return None
+        job.status = RecipeImageUpload.PROCESSING
+        job.save(update_fields=['status', 'updated_at'])
+    return job
+
+
+def _fail(job, error):
+    ''' Mark a job as failed with the error that stopped it '''
+    job.status = RecipeImageUpload.FAILED
+    job.error = str(error) or error.__class__.__name__
+    job.save(update_fields=['status', 'error', 'updated_at'])
+    return job
+
+
+def claim_next_upload(stale_after):
+    ''' Mark the oldest waiting upload as processing and return it '''
+    return _claim_next(RecipeImageUpload, stale_after)
+
+
+def claim_next_variant_job(stale_after):
+    ''' Mark the oldest waiting variant job as processing and return it '''
+    return _claim_next(ImageVariantJob, stale_after)
+
+
+def normalize_image(source):
+    ''' Verify an image and return it re-encoded as bounded JPEG bytes '''
+    with Image.open(source) as image:
+        image.verify()
+    source.seek(0)
+    max_size = settings.RECIPE_IMAGE_MAX_SIZE
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        image.thumbnail((max_size, max_size))
+        output = BytesIO()
+        image.save(
+            output, format='JPEG', optimize=True,
+            quality=settings.RECIPE_IMAGE_QUALITY,
+        )
+    return output.getvalue()
+
+
+# Modern formats stored next to each JPEG variant as <name>.jpg.<ext>, the
+# proxy serves them to clients that list the type in their Accept header.
+MODERN_FORMATS = [
+    ('AVIF', 'avif', {'quality': 60}),
+    ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+]
+
+
+def variant_names(image_name):
+    ''' Return the (width, name) of each JPEG variant of a stored image '''
+    directory, file_name = os.path.split(image_name)
+    stem = os.path.splitext(file_name)[0]
+    return [
+        (width, os.path.join(directory, 'variants', stem, f'{width}.jpg'))
+        for width in settings.RECIPE_IMAGE_VARIANT_WIDTHS
+    ]
+
+
+def _encode(image, image_format, **options):
+    ''' Return the image encoded in the given format '''
+    output = BytesIO()
+    image.save(output, format=image_format, **options)
+    return ContentFile(output.getvalue())
+
+
+def generate_variants(image_name, storage, force=False):
+    ''' Write the resized JPEG, WebP and AVIF variants of a stored image
+
+    Image names identify their content, so variants that already exist
+    are kept unless force is given.
+    '''
+    modern_formats = [
+        (image_format, ext, options)
+        for image_format, ext, options in MODERN_FORMATS
+        if features.check(ext)
+    ]
+    variants = [
+        (width, [name] + [f'{name}.{ext}' for _, ext, _ in modern_formats])
+        for width, name in variant_names(image_name)
+    ]
+    if force:
+        for _, names in variants:
+            for name in names:
+                storage.delete(name)
+    elif all(storage.exists(name) for _, names in variants for name in names):
+        return
+    with storage.open(image_name, 'rb') as source:
+        with Image.open(source) as original:
+            original = ImageOps.exif_transpose(original).convert('RGB')
+            for width, name in variant_names(image_name):
+                image = original.copy()
+                image.thumbnail((width, width))
+                storage.save(name, _encode(
+                    image, 'JPEG', optimize=True,
+                    quality=settings.RECIPE_IMAGE_QUALITY,
+                ))
+                for image_format, ext, options in modern_formats:
+                    storage.save(
+                        f'{name}.{ext}',
+                        _encode(image, image_format, **options),
+                    )
+
+
+def queue_variants(image_name):
+    ''' Have the background worker write the variants of a stored image '''
+    if image_name:
+        ImageVariantJob.objects.create(image=image_name)
+
+
+def process_variant_job(job):
+    ''' Write the variants of a queued image and record the outcome '''
+    storage = Recipe._meta.get_field('image').storage
+    try:
+        generate_variants(job.image, storage)
+    except Exception as error:  # Pillow raises many unrelated types.
+        return _fail(job, error)
+    job.status = RecipeImageUpload.DONE
+    job.save(update_fields=['status', 'updated_at'])
+    return job
+
+
+def delete_image(image_name, storage):
+    ''' Delete a stored image together with all of its variants '''
+    for _, name in variant_names(image_name):
+        storage.delete(name)
+        for _, ext, _ in MODERN_FORMATS:
+            storage.delete(f'{name}.{ext}')
+    storage.delete(image_name)
+
+
+def release_image(image_name):
+    ''' Delete an image once no recipe references it any more
+
+    The reference count is the number of recipes naming the file, read
+    from the indexed image column. Files written or reused within the
+    grace period are kept, a recipe about to reference them may not be
+    committed yet. The orphan collector picks those up later.
+    '''
+    storage = Recipe._meta.get_field('image').storage
+    if not image_name or Recipe.objects.filter(image=image_name).exists():
+        return False
+    if storage.exists(image_name):
+        age = timezone.now() - storage.get_modified_time(image_name)
+        if age.total_seconds() < settings.RECIPE_IMAGE_GRACE_SECONDS:
+            return False
+    delete_image(image_name, storage)
+    return True
+
+
+def release_image_on_commit(image_name):
+    ''' Release an image once the current transaction commits '''
+    if image_name:
+        transaction.on_commit(lambda: release_image(image_name))
+
+
+def process_upload(upload):
+    ''' Normalize an upload and swap it in as its recipe's image
+
+    Any error, from Pillow, an encoder, the storage or the database, marks
+    the upload failed rather than stopping the worker. A file stored
+    before the error is left to the orphan collector.
+    '''
+    try:
+        with upload.upload.open('rb') as source:
+            content = normalize_image(source)
+        return _store_upload(upload, content)
+    except Exception as error:  # Pillow raises many unrelated types.
+        return _fail(upload, error)
+
+
+def _store_upload(upload, content):
+    ''' Store normalized image bytes and make them the recipe's image '''
+    # Write the file before taking any lock, the swap is then one update.
+    image_field = Recipe._meta.get_field('image')
+    content = ContentFile(content)
+    name = image_field.storage.save(
+        content_file_path(content, 'image.jpg'), content
+    )
+    generate_variants(name, image_field.storage)
+    upload.upload.delete(save=False)
+    with transaction.atomic():
+        try:
+            recipe = Recipe.objects.select_for_update().get(
+                pk=upload.recipe_id
+            )
+        except Recipe.DoesNotExist:
+            release_image_on_commit(name)
+            return upload
+        release_image_on_commit(recipe.image.name)
+        recipe.image.name = name
+        recipe.save(update_fields=['image', 'updated_at'])
+        upload.status = RecipeImageUpload.DONE
+        upload.save(update_fields=['status', 'upload', 'updated_at'])
+    return upload
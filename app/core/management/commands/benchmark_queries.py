@@ -0,0 +1,234 @@
+''' Benchmark the hot recipe API queries on a seeded dataset '''
+import statistics
+from time import perf_counter
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.core.management.base import BaseCommand, CommandError
+from django.db import ProgrammingError, connection, transaction
+from django.db.models import Count, F, Max, Q
+
+from core.models import User, Recipe, Tag, Ingredient, SEARCH_CONFIG
+
+
+SEED_EMAIL_DOMAIN = 'benchmark.invalid'
+
+
+class Command(BaseCommand):
+    """Print query plans and latencies for the per-user access patterns.
+
+    Run it before and after a migration to compare, for example::
+
+        python manage.py migrate core 0006
+        python manage.py benchmark_queries --seed
+        python manage.py migrate core
+        python manage.py benchmark_queries
+
+    The querysets defer the columns later migrations add, and a query
+    filtering on one of them is skipped while the schema lacks it.
+    """
+
+    help = 'Seed benchmark data and EXPLAIN ANALYZE the hot API queries.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed', action='store_true',
+            help='Insert the benchmark users, recipes, tags and ingredients.',
+        )
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes-per-user', type=int, default=20000)
+        parser.add_argument('--attrs-per-user', type=int, default=200)
+        parser.add_argument('--links-per-recipe', type=int, default=5)
+        parser.add_argument('--runs', type=int, default=20)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('The benchmark needs a PostgreSQL database.')
+        if options['runs'] < 2:
+            raise CommandError('--runs must be at least 2.')
+        if options['seed']:
+            self.seed(options)
+        user = User.objects.filter(
+            email__endswith=f'@{SEED_EMAIL_DOMAIN}'
+        ).order_by('id').first()
+        if user is None:
+            raise CommandError('No benchmark data, run with --seed first.')
+
+        search = SearchQuery(
+            'recipe 42', config=SEARCH_CONFIG, search_type='websearch'
+        )
+        # Every seeded title holds this word, so it matches all recipes of
+        # every user.
+        common = SearchQuery('recipe', config=SEARCH_CONFIG)
+        recipes = Recipe.objects.defer('search_vector')
+        tags = Tag.objects.defer('recipe_count')
+        ingredients = Ingredient.objects.defer('recipe_count')
+        tag_ids = list(
+            tags.filter(user=user).values_list('id', flat=True)[:3]
+        )
+        querysets = {
+            'recipe list page': recipes.filter(
+                user=user).order_by('-id')[:25],
+            'recipes by tag (join)': recipes.filter(
+                user=user, tags__id__in=tag_ids
+            ).order_by('-id').distinct()[:25],
+            'recipes by tag (exists)': recipes.filter(
+                user=user
+            ).linked_to('tags', tag_ids).order_by('-id')[:25],
+            'recipes with all tags (join)': recipes.filter(
+                user=user, tags__id=tag_ids[0]
+            ).filter(tags__id=tag_ids[1]).order_by('-id')[:25],
+            'recipes with all tags (exists)': recipes.filter(
+                user=user
+            ).linked_to('tags', tag_ids[:2], match_all=True).order_by(
+                '-id')[:25],
+            'recipes with all tags (having)': recipes.filter(
+                user=user, pk__in=Recipe.tags.through.objects.filter(
+                    tag_id__in=tag_ids[:2]
+                ).values('recipe_id').annotate(
+                    matched=Count('*')
+                ).filter(matched=2).values('recipe_id')
+            ).order_by('-id')[:25],
+            'recipe search': recipes.search(user, search).annotate(
+                rank=SearchRank(F('search_vector'), search)
+            ).order_by('-rank', '-id')[:25],
+            'recipe search, common term': recipes.search(
+                user, common
+            ).annotate(
+                rank=SearchRank(F('search_vector'), common)
+            ).order_by('-rank', '-id')[:25],
+            'search validators, common term': recipes.search(
+                user, common
+            ).order_by().values('user').annotate(
+                last_modified=Max('updated_at'), count=Count('*')
+            ),
+            'quick cheap recipes by time': recipes.filter(
+                user=user, time_in_minutes__lte=30, price__lte=10
+            ).order_by('time_in_minutes', 'id')[:25],
+            'recipes by price, next page': recipes.filter(
+                user=user
+            ).filter(
+                Q(price__lte=20),
+                Q(price__lt=20) | Q(price=20, id__lt=2**31),
+            ).order_by('-price', '-id')[:25],
+            'tag list': tags.filter(user=user).order_by('-name'),
+            'ingredient list': ingredients.filter(
+                user=user).order_by('-name'),
+            'assigned tags (join)': tags.filter(
+                user=user, recipe__isnull=False
+            ).order_by('-name').distinct(),
+            'assigned tags (count)': tags.filter(
+                user=user, recipe_count__gt=0
+            ).order_by('-name'),
+            'tags by usage': tags.filter(
+                user=user
+            ).order_by('-recipe_count', '-name'),
+            'facets by tag': recipes.filter(
+                user=user
+            ).linked_to('tags', tag_ids[:1]).facet_counts(
+                'tags', 'ingredients'),
+            'facets by search': recipes.search(
+                user, search
+            ).facet_counts('tags', 'ingredients'),
+        }
+        for label, queryset in querysets.items():
+            self.benchmark(label, queryset, options['runs'])
+
+    def benchmark(self, label, queryset, runs):
+        ''' Print the plan and latency percentiles for a queryset '''
+        sql, params = queryset.query.sql_with_params()
+        timings = []
+        self.stdout.write(self.style.MIGRATE_HEADING(label))
+        with connection.cursor() as cursor:
+            try:
+                with transaction.atomic():
+                    cursor.execute(
+                        f'EXPLAIN (ANALYZE, BUFFERS) {sql}', params
+                    )
+            except ProgrammingError as error:
+                reason = str(error).splitlines()[0]
+                self.stdout.write(self.style.WARNING(
+                    f'Skipped, not supported by this schema: {reason}'
+                ))
+                return
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+            for _ in range(runs):
+                start = perf_counter()
+                cursor.execute(sql, params)
+                cursor.fetchall()
+                timings.append((perf_counter() - start) * 1000)
+        p95 = statistics.quantiles(timings, n=20)[18]
+        self.stdout.write(plan)
+        self.stdout.write(
+            f'median {statistics.median(timings):.2f} ms, '
+            f'p95 {p95:.2f} ms over {runs} runs\n'
+        )
+
+    @transaction.atomic
+    def seed(self, options):
+        ''' Insert the benchmark rows with set based SQL '''
+        users = options['users']
+        recipes = options['recipes_per_user']
+        attrs = options['attrs_per_user']
+        links = options['links_per_recipe']
+        self.stdout.write(
+            f'Seeding {users} users with {recipes} recipes each...'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                '''
+                INSERT INTO core_user (
+                    password, email, name, phone_number, is_active,
+                    is_staff, is_superuser
+                )
+                SELECT '!', 'bench' || g || '@' || %s, 'Bench ' || g,
+                       'b' || g, true, false, false
+                FROM generate_series(1, %s) AS g
+                ON CONFLICT DO NOTHING
+                ''',
+                [SEED_EMAIL_DOMAIN, users],
+            )
+            cursor.execute(
+                '''
+                INSERT INTO core_recipe (
+                    user_id, title, description, time_in_minutes, price,
+                    link, image, created_at, updated_at
+                )
+                SELECT u.id, 'Recipe ' || g, 'Benchmark recipe',
+                       1 + g %% 180, (g %% 5000) / 100.0, '', '',
+                       now(), now()
+                FROM core_user AS u, generate_series(1, %s) AS g
+                WHERE u.email LIKE %s
+                ''',
+                [recipes, f'%@{SEED_EMAIL_DOMAIN}'],
+            )
+            for model, table in ((Tag, 'tags'), (Ingredient, 'ingredients')):
+                attr_table = model._meta.db_table
+                link_column = f'{model._meta.model_name}_id'
+                cursor.execute(
+                    f'''
+                    INSERT INTO {attr_table} (
+                        user_id, name, created_at, updated_at
+                    )
+                    SELECT u.id, 'Name ' || g, now(), now()
+                    FROM core_user AS u, generate_series(1, %s) AS g
+                    WHERE u.email LIKE %s
+                    ON CONFLICT DO NOTHING
+                    ''',
+                    [attrs, f'%@{SEED_EMAIL_DOMAIN}'],
+                )
+                cursor.execute(
+                    f'''
+                    INSERT INTO core_recipe_{table} (recipe_id, {link_column})
+                    SELECT r.id, a.id
+                    FROM core_recipe AS r
+                    JOIN core_user AS u ON u.id = r.user_id
+                    JOIN generate_series(0, %s - 1) AS g ON true
+                    JOIN {attr_table} AS a ON a.user_id = r.user_id
+                        AND a.name = 'Name ' || (1 + (r.id + g * 7) %% %s)
+                    WHERE u.email LIKE %s
+                    ON CONFLICT DO NOTHING
+                    ''',
+                    [links, attrs, f'%@{SEED_EMAIL_DOMAIN}'],
+                )
+            cursor.execute('ANALYZE')
+        self.stdout.write(self.style.SUCCESS('Seeded benchmark data.'))
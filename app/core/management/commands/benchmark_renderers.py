@@ -0,0 +1,77 @@
+''' Benchmark the API renderers over increasing response sizes '''
+import statistics
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+
+from rest_framework.renderers import JSONRenderer
+
+from core.renderers import MessagePackRenderer, ORJSONRenderer, msgpack
+
+
+def sample_recipe(i):
+    ''' Return a recipe as the list endpoint represents it '''
+    image = f'http://localhost/media/uploads/recipe/{i:064x}.jpg'
+    return {
+        'id': i,
+        'title': f'Recipe {i} crème brûlée',
+        'time_in_minutes': 10 + i % 50,
+        'price': f'{i % 100}.99',
+        'link': f'https://example.com/recipes/{i}',
+        'description': 'Whisk, fold and bake until golden. ' * 4,
+        'tags': [
+            {'id': i * 3 + n, 'name': f'Tag {n}'} for n in range(3)
+        ],
+        'ingredients': [
+            {'id': i * 5 + n, 'name': f'Ingredient {n}'} for n in range(5)
+        ],
+        'image': image,
+        'image_variants': {
+            str(width): image.replace('.jpg', f'/{width}.jpg')
+            for width in (320, 640, 1280)
+        },
+    }
+
+
+class Command(BaseCommand):
+    """Print the render time of each renderer per response size.
+
+    The payloads are recipe list pages shaped like the API output, the
+    stdlib JSON renderer is the baseline.
+    """
+
+    help = 'Time the JSON and MessagePack renderers per response size.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[1, 10, 100, 1000],
+            help='Number of recipes per rendered page.',
+        )
+        parser.add_argument('--runs', type=int, default=50)
+
+    def handle(self, *args, **options):
+        renderers = {
+            'json (stdlib)': JSONRenderer(),
+            'json (orjson)': ORJSONRenderer(),
+        }
+        if msgpack is not None:
+            renderers['msgpack'] = MessagePackRenderer()
+        for size in options['sizes']:
+            data = {
+                'next': 'http://localhost/api/recipes/recipes/?cursor=abc',
+                'previous': None,
+                'results': [sample_recipe(i) for i in range(size)],
+            }
+            baseline = None
+            for label, renderer in renderers.items():
+                timings = []
+                for _ in range(options['runs']):
+                    start = perf_counter()
+                    content = renderer.render(data)
+                    timings.append((perf_counter() - start) * 1e6)
+                median = statistics.median(timings)
+                baseline = baseline or median
+                self.stdout.write(
+                    f'{size:>5} recipes  {label:<14}{len(content):>10} bytes'
+                    f'{median:>12.1f} us  {baseline / median:>5.1f}x'
+                )
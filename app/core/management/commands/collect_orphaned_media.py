@@ -0,0 +1,183 @@
+''' Delete media files no longer referenced by the database '''
+import hashlib
+import math
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from core.models import Recipe, RecipeImageUpload
+
+
+# Upload directories and the model field referencing their files.
+REFERENCES = {
+    os.path.join('uploads', 'recipe'): (Recipe, 'image'),
+    os.path.join('uploads', 'pending'): (RecipeImageUpload, 'upload'),
+}
+VARIANTS_DIR = 'variants'
+
+
+class BloomFilter:
+    """Fixed size set membership with false positives but no misses.
+
+    A false positive only keeps an orphan for another run, so it trades
+    exactness for memory that does not grow with the number of files.
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        # Tiny filters saturate, a few kilobytes cost nothing.
+        capacity = max(capacity, 1024)
+        self.size = math.ceil(
+            -capacity * math.log(error_rate) / math.log(2) ** 2
+        )
+        self.hashes = max(round(self.size / capacity * math.log(2)), 1)
+        self.bits = bytearray(math.ceil(self.size / 8))
+
+    def _positions(self, value):
+        ''' Return the bit positions of a value '''
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'big')
+        second = int.from_bytes(digest[8:], 'big')
+        return (
+            (first + i * second) % self.size for i in range(self.hashes)
+        )
+
+    def add(self, value):
+        ''' Add a value to the filter '''
+        for position in self._positions(value):
+            self.bits[position // 8] |= 1 << position % 8
+
+    def __contains__(self, value):
+        return all(
+            self.bits[position // 8] & 1 << position % 8
+            for position in self._positions(value)
+        )
+
+
+def scan_files(root):
+    ''' Yield every file below root without listing whole directories
+
+    Subdirectories are walked as they are met, so memory grows with the
+    depth of the tree rather than with the number of directories, such
+    as the one variants directory per image.
+    '''
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from scan_files(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                yield entry
+
+
+class Command(BaseCommand):
+    """Garbage collect orphaned uploads under MEDIA_ROOT.
+
+    Referenced names are streamed into a Bloom filter, then the upload
+    tree is streamed and files missing from the filter become candidates.
+    Candidates older than the grace period are checked against the
+    database again in batches right before they are deleted.
+    """
+
+    help = 'Delete uploaded files that no database row references.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int, default=settings.RECIPE_IMAGE_GRACE_SECONDS,
+            help='Keep files modified within this many seconds.',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report the orphans without deleting them.',
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.deleted_files = 0
+        self.deleted_bytes = 0
+        cutoff = time.time() - options['grace']
+        for directory, (model, field) in REFERENCES.items():
+            root = os.path.join(settings.MEDIA_ROOT, directory)
+            if not os.path.isdir(root):
+                continue
+            referenced = self.build_filter(model, field)
+            batch = []
+            for entry in scan_files(root):
+                name = os.path.relpath(entry.path, settings.MEDIA_ROOT)
+                owner = self.owner_name(directory, name)
+                if owner in referenced:
+                    continue
+                stat = entry.stat(follow_symlinks=False)
+                if stat.st_mtime > cutoff:
+                    continue
+                batch.append((owner, entry.path, stat.st_size))
+                if len(batch) >= options['batch_size']:
+                    self.delete_orphans(model, field, batch)
+                    batch = []
+            self.delete_orphans(model, field, batch)
+        verb = 'Would reclaim' if options['dry_run'] else 'Reclaimed'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {self.deleted_bytes} bytes '
+            f'in {self.deleted_files} files.'
+        ))
+
+    def build_filter(self, model, field):
+        ''' Stream the referenced names of a field into a Bloom filter '''
+        names = model.objects.exclude(**{field: ''}).exclude(
+            **{f'{field}__isnull': True}
+        )
+        referenced = BloomFilter(names.count())
+        for name in names.values_list(field, flat=True).iterator(
+                chunk_size=self.options['batch_size']):
+            referenced.add(self.stem(name))
+        return referenced
+
+    def stem(self, name):
+        ''' Return a file name without its extension '''
+        return os.path.splitext(os.path.normpath(name))[0]
+
+    def owner_name(self, directory, name):
+        ''' Return the stem of the upload a file belongs to
+
+        Variants live in <directory>/variants/<stem>/ and belong to the
+        upload <directory>/<stem>.<ext>.
+        '''
+        parts = os.path.relpath(name, directory).split(os.sep)
+        if len(parts) > 2 and parts[0] == VARIANTS_DIR:
+            return os.path.join(directory, parts[1])
+        return self.stem(name)
+
+    def delete_orphans(self, model, field, batch):
+        ''' Delete the candidates the database confirms are unreferenced '''
+        if not batch:
+            return
+        owners = {owner for owner, _, _ in batch}
+        lookup = Q()
+        for owner in owners:
+            lookup |= Q(**{f'{field}__startswith': f'{owner}.'})
+        still_referenced = {
+            self.stem(name) for name in model.objects.filter(
+                lookup).values_list(field, flat=True)
+        }
+        for owner, path, size in batch:
+            if owner in still_referenced:
+                continue
+            if not self.options['dry_run']:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                self.remove_empty_parent(path)
+            self.deleted_files += 1
+            self.deleted_bytes += size
+
+    def remove_empty_parent(self, path):
+        ''' Remove the variant directory of a deleted file once empty '''
+        parent = os.path.dirname(path)
+        if os.path.basename(os.path.dirname(parent)) == VARIANTS_DIR:
+            try:
+                os.rmdir(parent)
+            except OSError:
+                pass
@@ -0,0 +1,38 @@
+''' Generate the resized variants of existing recipe images '''
+from django.core.management.base import BaseCommand
+
+from core.images import generate_variants, variant_names
+from core.models import Recipe
+
+
+class Command(BaseCommand):
+    """Backfill the image variants of recipes uploaded before them."""
+
+    help = 'Generate missing resized variants of recipe images.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Regenerate variants that already exist.',
+        )
+
+    def handle(self, *args, **options):
+        generated = 0
+        recipes = Recipe.objects.exclude(image='').exclude(
+            image__isnull=True
+        ).only('id', 'image')
+        for recipe in recipes.iterator(chunk_size=500):
+            storage = recipe.image.storage
+            names = [name for _, name in variant_names(recipe.image.name)]
+            if not options['force'] and all(map(storage.exists, names)):
+                continue
+            if not storage.exists(recipe.image.name):
+                self.stderr.write(f'Recipe {recipe.id}: image file missing')
+                continue
+            generate_variants(
+                recipe.image.name, storage, force=options['force']
+            )
+            generated += 1
+        self.stdout.write(
+            self.style.SUCCESS(f'Generated variants for {generated} images.')
+        )
@@ -0,0 +1,124 @@
+''' Measure the latency of an endpoint per number of concurrent clients '''
+import asyncio
+import statistics
+from time import perf_counter
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+async def read_response(reader):
+    ''' Read one HTTP/1.1 response, return its status and keep-alive '''
+    head = await reader.readuntil(b'\r\n\r\n')
+    status_line, *header_lines = head.decode('latin-1').split('\r\n')
+    status = int(status_line.split()[1])
+    headers = {}
+    for line in filter(None, header_lines):
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip().lower()
+    if headers.get('transfer-encoding') == 'chunked':
+        while size := int((await reader.readline()).split(b';')[0], 16):
+            await reader.readexactly(size + 2)
+        await reader.readline()
+    elif 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    else:
+        await reader.read()
+        return status, False
+    return status, headers.get('connection') != 'close'
+
+
+class Command(BaseCommand):
+    """Print throughput and latency percentiles per concurrency level.
+
+    Each simulated client sends GET requests over its own keep-alive
+    connection for the given duration, back to back. Only the standard
+    library is used, so the command runs wherever the app runs, e.g.
+    against uWSGI's --http-socket and against uvicorn to compare the
+    SERVER_MODE settings.
+    """
+
+    help = 'Load an endpoint with concurrent clients and print latencies.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='The http:// URL to request.')
+        parser.add_argument(
+            '--token', help='API token sent as the Authorization header.',
+        )
+        parser.add_argument(
+            '--concurrency', type=int, nargs='+', default=[1, 8, 32, 128],
+            help='Numbers of concurrent clients to measure.',
+        )
+        parser.add_argument(
+            '--duration', type=float, default=10,
+            help='Seconds to load the endpoint at each concurrency level.',
+        )
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        if url.scheme != 'http':
+            raise CommandError('Only http:// URLs are supported.')
+        path = url.path or '/'
+        if url.query:
+            path += f'?{url.query}'
+        request = [f'GET {path} HTTP/1.1', f'Host: {url.netloc}']
+        if options['token']:
+            request.append(f"Authorization: Token {options['token']}")
+        request = ('\r\n'.join(request) + '\r\n\r\n').encode()
+        address = (url.hostname, url.port or 80)
+
+        self.stdout.write(
+            f"{'clients':>8}{'requests':>10}{'req/s':>10}"
+            f"{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}"
+        )
+        for concurrency in options['concurrency']:
+            latencies, errors = asyncio.run(self._load(
+                address, request, concurrency, options['duration']
+            ))
+            if len(latencies) < 2:
+                raise CommandError('Too few requests, raise --duration.')
+            cuts = statistics.quantiles(latencies, n=100)
+            self.stdout.write(
+                f'{concurrency:>8}{len(latencies):>10}'
+                f'{len(latencies) / options["duration"]:>10.0f}'
+                f'{cuts[49]:>10.1f}{cuts[98]:>10.1f}{errors:>8}'
+            )
+
+    async def _load(self, address, request, concurrency, duration):
+        ''' Run the clients, return the latencies and failed requests '''
+        latencies = []
+        errors = []
+        deadline = perf_counter() + duration
+        await asyncio.gather(*(
+            self._client(address, request, deadline, latencies, errors)
+            for _ in range(concurrency)
+        ))
+        return latencies, len(errors)
+
+    async def _client(self, address, request, deadline, latencies, errors):
+        ''' Send requests back to back until the deadline '''
+        connection = None
+        while perf_counter() < deadline:
+            start = perf_counter()
+            status = None
+            # Retry once on a new connection when a reused one was closed
+            # by the server, as HTTP clients do for idempotent requests.
+            for reused in (connection is not None, False):
+                try:
+                    if connection is None:
+                        connection = await asyncio.open_connection(*address)
+                    reader, writer = connection
+                    writer.write(request)
+                    status, keep_alive = await read_response(reader)
+                except (OSError, ValueError, asyncio.IncompleteReadError):
+                    keep_alive = False
+                if not keep_alive and connection is not None:
+                    connection[1].close()
+                    connection = None
+                if status is not None or not reused:
+                    break
+            latencies.append((perf_counter() - start) * 1000)
+            if status != 200:
+                errors.append(status)
+        if connection is not None:
+            connection[1].close()
@@ -0,0 +1,66 @@
+''' Process the queued recipe image uploads '''
+from time import sleep
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.images import (
+    claim_next_upload, claim_next_variant_job, process_upload,
+    process_variant_job,
+)
+
+
+class Command(BaseCommand):
+    """Validate and normalize uploaded images off the request path.
+
+    Queued uploads go first, then the variants of images stored by the
+    synchronous upload endpoint. A failing job is marked failed, and an
+    error outside of a job, e.g. while the database restarts, is logged
+    before polling again, so the worker keeps running.
+    """
+
+    help = 'Run the background worker for queued recipe images.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Exit once the queue is empty instead of polling.',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=1.0,
+            help='Seconds to wait between polls of an empty queue.',
+        )
+        parser.add_argument(
+            '--stale-after', type=int, default=300,
+            help='Seconds after which a processing upload is retried.',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                processed = self.process_next(options['stale_after'])
+            except Exception as error:  # Keep polling, see the docstring.
+                self.stderr.write(f'Image worker error: {error!r}')
+                close_old_connections()
+                if options['once']:
+                    raise
+                processed = False
+            if processed:
+                continue
+            if options['once']:
+                break
+            sleep(options['interval'])
+
+    def process_next(self, stale_after):
+        ''' Process one queued job, return whether there was one '''
+        upload = claim_next_upload(stale_after)
+        if upload is not None:
+            upload = process_upload(upload)
+            self.stdout.write(f'Image upload {upload.pk}: {upload.status}')
+            return True
+        job = claim_next_variant_job(stale_after)
+        if job is not None:
+            job = process_variant_job(job)
+            self.stdout.write(f'Image variants {job.pk}: {job.status}')
+            return True
+        return False
@@ -1,21 +1,29 @@
 ''' Wait for the database to be ready '''
 
 from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
 from django.db.utils import OperationalError
 from time import sleep
 
 
 class Command(BaseCommand):
-    """Command to wait for the database to be available."""
+    """Command to wait for the database to be available.
+
+    Connects like the app does, with the same timeout, pool and pgbouncer
+    settings, so a ready database is one the app can use.
+    """
 
     def handle(self, *args, **options):
         self.stdout.write("Waiting for the database...")
+        connection = connections[DEFAULT_DB_ALIAS]
         db_ready = False
         while not db_ready:
             try:
-                self.check(databases=['default'])
+                connection.ensure_connection()
                 db_ready = True
             except OperationalError:
                 self.stdout.write("Database unavailable, waiting 1 second...")
                 sleep(1)
+        # Hand the connection back, to the pool when there is one.
+        connection.close()
         self.stdout.write(self.style.SUCCESS("Database is ready!"))
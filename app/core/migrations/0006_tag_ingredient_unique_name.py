@@ -0,0 +1,60 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:11
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_names(apps, schema_editor):
+    ''' Merge tags and ingredients sharing a user and name into one row '''
+    Recipe = apps.get_model('core', 'Recipe')
+    for field_name, model_name in (('tags', 'Tag'),
+                                   ('ingredients', 'Ingredient')):
+        model = apps.get_model('core', model_name)
+        through = getattr(Recipe, field_name).through
+        link_field = f'{model_name.lower()}_id'
+        duplicates = model.objects.values('user_id', 'name').annotate(
+            keep_id=Min('id'), total=Count('id')
+        ).filter(total__gt=1)
+        for duplicate in duplicates:
+            extra_ids = list(
+                model.objects.filter(
+                    user_id=duplicate['user_id'], name=duplicate['name']
+                ).exclude(id=duplicate['keep_id']).values_list('id', flat=True)
+            )
+            links = through.objects.filter(**{f'{link_field}__in': extra_ids})
+            recipe_ids = set(links.values_list('recipe_id', flat=True))
+            links.delete()
+            through.objects.bulk_create(
+                [
+                    through(recipe_id=recipe_id,
+                            **{link_field: duplicate['keep_id']})
+                    for recipe_id in recipe_ids
+                ],
+                ignore_conflicts=True,
+            )
+            model.objects.filter(id__in=extra_ids).delete()
+
+
+class Migration(migrations.Migration):
+    # The merge runs in its own transaction, so it applies all or nothing
+    # and commits before the constraints are added. Postgres refuses to
+    # alter a table with pending deferred foreign key checks.
+    atomic = False
+
+    dependencies = [
+        ('core', '0005_recipe_image'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_names, migrations.RunPython.noop, atomic=True
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='unique_ingredient_name_per_user'),
+        ),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='unique_tag_name_per_user'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:13
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build the index without blocking writes to the recipes.
+    atomic = False
+
+    dependencies = [
+        ('core', '0006_tag_ingredient_unique_name'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='recipe',
+            index=models.Index(fields=['user', '-id'], name='recipe_user_id_desc_idx'),
+        ),
+    ]
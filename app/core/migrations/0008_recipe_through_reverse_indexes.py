@@ -0,0 +1,34 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:20
+
+from django.db import migrations
+
+
+# The auto created through tables cannot declare Meta.indexes. Postgres
+# already has (recipe_id, tag_id) from the unique constraint, the reverse
+# order lets tag and ingredient lookups run as index only scans.
+THROUGH_INDEXES = [
+    ('core_recipe_tags', 'tag_id'),
+    ('core_recipe_ingredients', 'ingredient_id'),
+]
+
+
+class Migration(migrations.Migration):
+    # Build the indexes without blocking writes to the links.
+    atomic = False
+
+    dependencies = [
+        ('core', '0007_recipe_user_id_desc_idx'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=(
+                f'CREATE INDEX CONCURRENTLY {table}_{column}_recipe_id_idx '
+                f'ON {table} ({column}, recipe_id);'
+            ),
+            reverse_sql=(
+                f'DROP INDEX CONCURRENTLY {table}_{column}_recipe_id_idx;'
+            ),
+        )
+        for table, column in THROUGH_INDEXES
+    ]
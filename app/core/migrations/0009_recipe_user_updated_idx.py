@@ -0,0 +1,20 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:23
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build the index without blocking writes to the recipes.
+    atomic = False
+
+    dependencies = [
+        ('core', '0008_recipe_through_reverse_indexes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='recipe',
+            index=models.Index(fields=['user', 'updated_at'], name='recipe_user_updated_idx'),
+        ),
+    ]
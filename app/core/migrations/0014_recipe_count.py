@@ -0,0 +1,133 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:54
+
+from django.db import migrations, models
+
+
+# (attribute table, through table, through column) of each counted link.
+COUNTED_LINKS = [
+    ('core_tag', 'core_recipe_tags', 'tag_id'),
+    ('core_ingredient', 'core_recipe_ingredients', 'ingredient_id'),
+]
+
+
+def count_trigger_sql(table, through, column, event, sign):
+    """Return the statement trigger applying inserted or deleted links.
+
+    The counts change once per statement from the transition table, so
+    bulk inserts, COPY imports and cascading deletes cost one update.
+    Rows are locked in id order first, concurrent writers then cannot
+    deadlock on the same attributes.
+    """
+    rows = 'new_links' if event == 'INSERT' else 'old_links'
+    transition = 'NEW' if event == 'INSERT' else 'OLD'
+    name = f'{through}_count_{event.lower()}'
+    return f"""
+        CREATE FUNCTION {name}() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            PERFORM 1 FROM {table}
+            WHERE id IN (SELECT {column} FROM {rows})
+            ORDER BY id FOR UPDATE;
+            UPDATE {table} AS a
+            SET recipe_count = a.recipe_count {sign} l.links
+            FROM (
+                SELECT {column}, count(*) AS links
+                FROM {rows} GROUP BY {column}
+            ) AS l
+            WHERE a.id = l.{column};
+            RETURN NULL;
+        END
+        $$;
+        CREATE TRIGGER {name} AFTER {event} ON {through}
+        REFERENCING {transition} TABLE AS {rows}
+        FOR EACH STATEMENT EXECUTE FUNCTION {name}();
+    """
+
+
+def guard_trigger_sql(table):
+    """Return the trigger keeping application writes off the count.
+
+    A full save() of a stale row would otherwise write back an old
+    count, only the link triggers one level down may change it.
+    """
+    name = f'{table}_keep_recipe_count'
+    return f"""
+        CREATE FUNCTION {name}() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF pg_trigger_depth() < 2 THEN
+                NEW.recipe_count := OLD.recipe_count;
+            END IF;
+            RETURN NEW;
+        END
+        $$;
+        CREATE TRIGGER {name} BEFORE UPDATE OF recipe_count ON {table}
+        FOR EACH ROW EXECUTE FUNCTION {name}();
+    """
+
+
+def backfill_sql(table, through, column):
+    """Return the statement counting the existing links."""
+    return f"""
+        UPDATE {table} AS a SET recipe_count = l.links
+        FROM (
+            SELECT {column}, count(*) AS links
+            FROM {through} GROUP BY {column}
+        ) AS l
+        WHERE a.id = l.{column};
+    """
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ] + [
+        # Creating the triggers locks the link tables, no link can change
+        # between them and the backfill.
+        migrations.RunSQL(
+            sql=(
+                count_trigger_sql(table, through, column, 'INSERT', '+')
+                + count_trigger_sql(table, through, column, 'DELETE', '-')
+                + backfill_sql(table, through, column)
+                + guard_trigger_sql(table)
+            ),
+            reverse_sql=f"""
+                DROP TRIGGER {through}_count_insert ON {through};
+                DROP FUNCTION {through}_count_insert();
+                DROP TRIGGER {through}_count_delete ON {through};
+                DROP FUNCTION {through}_count_delete();
+                DROP TRIGGER {table}_keep_recipe_count ON {table};
+                DROP FUNCTION {table}_keep_recipe_count();
+            """,
+        )
+        for table, through, column in COUNTED_LINKS
+    ] + [
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', 'recipe_count', 'name'], name='ingredient_user_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(condition=models.Q(('recipe_count__gt', 0)), fields=['user', 'name'], name='ingredient_user_assigned_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', 'recipe_count', 'name'], name='tag_user_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(condition=models.Q(('recipe_count__gt', 0)), fields=['user', 'name'], name='tag_user_assigned_idx'),
+        ),
+    ]
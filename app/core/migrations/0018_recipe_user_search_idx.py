@@ -0,0 +1,28 @@
+# Generated by Django 5.1.3 on 2026-10-18 08:40
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import (
+    AddIndexConcurrently, BtreeGinExtension, RemoveIndexConcurrently,
+)
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # Swap the GIN indexes without blocking writes to the recipes.
+    atomic = False
+
+    dependencies = [
+        ('core', '0017_imagevariantjob'),
+    ]
+
+    operations = [
+        BtreeGinExtension(),
+        AddIndexConcurrently(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['user', 'search_vector'], name='recipe_user_search_idx'),
+        ),
+        RemoveIndexConcurrently(
+            model_name='recipe',
+            name='recipe_search_vector_idx',
+        ),
+    ]
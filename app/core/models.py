@@ -1,20 +1,47 @@
 
 ''' Database models '''
+import hashlib
 import uuid
 import os
 
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.db import models
+from django.db.models import Exists, OuterRef, Q, Value
+from django.db.models.functions import Cast
+
+from .storage import recipe_image_storage
 
 from django.contrib.auth.models import (
     AbstractBaseUser, BaseUserManager, PermissionsMixin
 )
 
 
+# Text search configuration of the stored recipe search vector.
+SEARCH_CONFIG = 'english'
+
+
+def content_file_path(content, file_name):
+    ''' Generate file path for recipe image from a hash of its bytes '''
+    ext = os.path.splitext(file_name)[1].lower()
+    hasher = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        hasher.update(chunk)
+    content.seek(0)
+    return os.path.join('uploads', 'recipe', f'{hasher.hexdigest()}{ext}')
+
+
 def recipe_image_file_path(instance, file_name):
     ''' Generate file path for recipe image  '''
+    return content_file_path(instance.image, file_name)
+
+
+def pending_image_file_path(instance, file_name):
+    ''' Generate file path for an image waiting to be processed '''
     ext = os.path.splitext(file_name)[1]
     file_name = f'{uuid.uuid4()}{ext}'
-    return os.path.join('uploads', 'recipe', file_name)
+    return os.path.join('uploads', 'pending', file_name)
 
 
 class UserManager(BaseUserManager):
@@ -69,6 +96,63 @@ class User(AbstractBaseUser, PermissionsMixin):
     REQUIRED_FIELDS = ['phone_number',]
 
 
+class RecipeQuerySet(models.QuerySet):
+    ''' Queries over recipes '''
+
+    def linked_to(self, field_name, ids, match_all=False):
+        ''' Filter the recipes linked to any, or all, of the given ids
+
+        Both forms are semi-joins on the through table, the recipe rows
+        are never multiplied and need no DISTINCT. Matching all ids takes
+        one semi-join per id, each a probe of the (recipe, target) unique
+        index that stops at the page limit, where grouping the links with
+        HAVING count(*) = n reads every link of the ids first.
+        '''
+        field = self.model._meta.get_field(field_name)
+        through = field.remote_field.through
+        target_field = field.m2m_reverse_field_name()
+        links = through.objects.filter(
+            **{field.m2m_field_name(): OuterRef('pk')}
+        )
+        if not match_all:
+            return self.filter(
+                Exists(links.filter(**{f'{target_field}__in': ids}))
+            )
+        return self.filter(*(
+            Exists(links.filter(**{target_field: target_id}))
+            for target_id in set(ids)
+        ))
+
+    def search(self, user, query):
+        ''' Filter the recipes of a user matching a search query
+
+        btree_gin only indexes bigint = bigint, while a plain user filter
+        compares with an integer literal. The id is passed as a bigint so
+        recipe_user_search_idx matches the user and the query in one scan.
+        '''
+        return self.filter(
+            user_id=Cast(Value(user.pk), models.BigIntegerField()),
+            search_vector=query,
+        )
+
+    def facet_counts(self, *field_names):
+        ''' Return (field, id, name, count) rows counting these recipes
+
+        The links of every relation are grouped in one UNION ALL query,
+        the recipes are a subquery and are never fetched.
+        '''
+        recipes = self.order_by().values('pk')
+        counts = []
+        for field_name in field_names:
+            field = self.model._meta.get_field(field_name)
+            counts.append(field.related_model.objects.filter(
+                **{f'{field.related_query_name()}__in': recipes}
+            ).values('id', 'name').annotate(
+                count=models.Count('*'), facet=models.Value(field_name)
+            ).values_list('facet', 'id', 'name', 'count').order_by())
+        return counts[0].union(*counts[1:], all=True)
+
+
 class Recipe(models.Model):
     ''' The recipe model '''
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -79,9 +163,48 @@ class Recipe(models.Model):
     link = models.CharField(max_length=255)
     tags = models.ManyToManyField('Tag')
     ingredients = models.ManyToManyField('Ingredient')
-    image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    image = models.ImageField(
+        null=True, db_index=True, upload_to=recipe_image_file_path,
+        storage=recipe_image_storage,
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Maintained by Postgres on every write, titles rank above descriptions.
+    search_vector = models.GeneratedField(
+        expression=(
+            SearchVector('title', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('description', weight='B', config=SEARCH_CONFIG)
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    objects = RecipeQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', '-id'], name='recipe_user_id_desc_idx'
+            ),
+            models.Index(
+                fields=['user', 'updated_at'], name='recipe_user_updated_idx'
+            ),
+            # The id breaks ties, so keyset pages on either sort order
+            # are a range scan in one direction of the index.
+            models.Index(
+                fields=['user', 'time_in_minutes', 'id'],
+                name='recipe_user_time_idx',
+            ),
+            models.Index(
+                fields=['user', 'price', 'id'], name='recipe_user_price_idx'
+            ),
+            # btree_gin lets the user id lead the GIN index, a search then
+            # only scans the matches of that user.
+            GinIndex(
+                fields=['user', 'search_vector'],
+                name='recipe_user_search_idx',
+            ),
+        ]
 
     def __str__(self) -> str:
         return self.title
@@ -91,9 +214,30 @@ class Tag(models.Model):
     ''' The tag model '''
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     name = models.CharField(max_length=200)
+    # Kept current by triggers on the recipe links, see migration 0014.
+    recipe_count = models.PositiveIntegerField(
+        default=0, db_default=0, editable=False
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'name'], name='unique_tag_name_per_user'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', 'recipe_count', 'name'],
+                name='tag_user_count_idx',
+            ),
+            models.Index(
+                fields=['user', 'name'], condition=Q(recipe_count__gt=0),
+                name='tag_user_assigned_idx',
+            ),
+        ]
+
     def __str__(self) -> str:
         return self.name
 
@@ -102,8 +246,109 @@ class Ingredient(models.Model):
     ''' The Ingredient Model '''
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     name = models.CharField(max_length=255)
+    # Kept current by triggers on the recipe links, see migration 0014.
+    recipe_count = models.PositiveIntegerField(
+        default=0, db_default=0, editable=False
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'name'],
+                name='unique_ingredient_name_per_user'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', 'recipe_count', 'name'],
+                name='ingredient_user_count_idx',
+            ),
+            models.Index(
+                fields=['user', 'name'], condition=Q(recipe_count__gt=0),
+                name='ingredient_user_assigned_idx',
+            ),
+        ]
+
     def __str__(self):
         return self.name
+
+
+class RecipeImageUpload(models.Model):
+    ''' A raw recipe image waiting for the background worker '''
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (PROCESSING, 'Processing'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
+    upload = models.FileField(upload_to=pending_image_file_path)
+    status = models.CharField(
+        max_length=20, choices=STATUS_CHOICES, default=PENDING
+    )
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['status', 'updated_at'],
+                name='image_upload_status_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} image ({self.status})'
+
+
+class ImageVariantJob(models.Model):
+    ''' A stored recipe image waiting for its variants to be written '''
+    image = models.CharField(max_length=255)
+    status = models.CharField(
+        max_length=20, choices=RecipeImageUpload.STATUS_CHOICES,
+        default=RecipeImageUpload.PENDING,
+    )
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['status', 'updated_at'],
+                name='image_variant_job_status_idx'
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return self.image
+
+
+class RecipeImport(models.Model):
+    ''' Progress of a bulk recipe import, committed with each batch '''
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    source = models.CharField(max_length=1024)
+    rows = models.BigIntegerField(default=0)
+    imported = models.BigIntegerField(default=0)
+    rejected = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'source'], name='unique_import_per_source'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.source} ({self.rows} rows)'
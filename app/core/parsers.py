@@ -0,0 +1,46 @@
+''' Parsers shared by the API apps '''
+import codecs
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+import orjson
+
+from django.conf import settings
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+
+from . import renderers
+
+
+class ORJSONParser(JSONParser):
+    ''' Parse UTF-8 JSON request bodies with orjson '''
+    renderer_class = renderers.ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        ''' Parse the incoming bytestream as JSON '''
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        # orjson reads UTF-8 only and rejects NaN and Infinity like the
+        # strict stdlib parser.
+        if codecs.lookup(encoding).name != 'utf-8' or not self.strict:
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
+
+
+class MessagePackParser(BaseParser):
+    ''' Parse MessagePack request bodies, needs msgpack installed '''
+    media_type = 'application/msgpack'
+    renderer_class = renderers.MessagePackRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        ''' Parse the incoming bytestream as MessagePack '''
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, msgpack.UnpackException) as exc:
+            raise ParseError('MessagePack parse error - %s' % str(exc))
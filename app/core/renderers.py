@@ -0,0 +1,58 @@
+''' Renderers shared by the API apps '''
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+import orjson
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+# orjson leaves datetimes and any other type it cannot serialize to the
+# DRF encoder, so values render as they do with the stdlib renderer.
+ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+
+def default(value):
+    ''' Convert a value orjson and msgpack do not handle like DRF does '''
+    return JSONEncoder().default(value)
+
+
+def dumps(data):
+    ''' Return data as compact UTF-8 JSON '''
+    return orjson.dumps(data, default=default, option=ORJSON_OPTIONS)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """Render JSON with orjson, byte for byte like the DRF renderer.
+
+    Pretty printed and ASCII only output, which orjson does not offer,
+    fall back to the stdlib renderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        ''' Render data into JSON, returning a bytestring '''
+        if data is None:
+            return b''
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent is not None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Keep the output a strict JavaScript subset, as DRF does.
+        return dumps(data).replace(
+            '\u2028'.encode(), b'\\u2028'
+        ).replace('\u2029'.encode(), b'\\u2029')
+
+
+class MessagePackRenderer(BaseRenderer):
+    ''' Render MessagePack, available when msgpack is installed '''
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        ''' Render data into MessagePack, returning a bytestring '''
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=default, use_bin_type=True)
@@ -0,0 +1,62 @@
+''' Signal handlers keeping the caches consistent with the database '''
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from .authentication import forget_tokens
+from .cache import bump_data_version, data_changed
+from .db import record_connection
+from .images import release_image_on_commit
+from .models import User, Recipe, Tag, Ingredient
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    ''' Forget a deleted token '''
+    forget_tokens([instance.key])
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    ''' Forget the tokens of a changed or deactivated user '''
+    if created:
+        return
+    keys = Token.objects.filter(user=instance).values_list('key', flat=True)
+    forget_tokens(list(keys))
+
+
+@receiver(post_save, sender=User)
+def start_user_data_version(sender, instance, created, **kwargs):
+    ''' Give a new user a fresh data version '''
+    if created:
+        bump_data_version(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+@receiver([post_save, post_delete], sender=Tag)
+@receiver([post_save, post_delete], sender=Ingredient)
+def invalidate_owner_data(sender, instance, **kwargs):
+    ''' Invalidate the owner's cached responses after a write '''
+    data_changed(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_linked_owner_data(sender, instance, action, **kwargs):
+    ''' Invalidate the owner's cached responses after a link change '''
+    if action.startswith('post_'):
+        data_changed(instance.user_id)
+
+
+@receiver(post_delete, sender=Recipe)
+def release_deleted_recipe_image(sender, instance, **kwargs):
+    ''' Drop the image file of a deleted recipe if nothing else uses it '''
+    release_image_on_commit(instance.image.name)
+
+
+@receiver(connection_created)
+def count_database_connection(sender, connection, **kwargs):
+    ''' Count the database connections opened by every worker '''
+    record_connection(connection)
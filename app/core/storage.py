@@ -0,0 +1,25 @@
+''' File storage for content addressed recipe images '''
+import os
+
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage where a name identifies the file content.
+
+    Saving a name that already exists keeps the stored file instead of
+    writing a renamed duplicate, and refreshes its modification time so
+    a concurrent release of the last reference leaves it alone.
+    """
+
+    def save(self, name, content, max_length=None):
+        ''' Store the content unless identical bytes are already stored '''
+        if name is not None and self.exists(name):
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length=max_length)
+
+
+def recipe_image_storage():
+    ''' Return the storage of recipe images '''
+    return ContentAddressedStorage()
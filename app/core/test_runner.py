@@ -0,0 +1,29 @@
+''' Test runner keeping the tests away from the shared caches '''
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+class LocMemCacheTestRunner(DiscoverRunner):
+    """Run the tests against private in-memory caches.
+
+    The file based caches live in /dev/shm and are shared with the
+    running server, tests clearing them would wipe its caches and runs
+    in parallel would see each other's entries. Every alias gets its own
+    LOCATION, locmem caches sharing one share their storage.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._caches_override = override_settings(CACHES={
+            alias: {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': alias,
+            }
+            for alias in settings.CACHES
+        })
+        self._caches_override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._caches_override.disable()
+        super().teardown_test_environment(**kwargs)
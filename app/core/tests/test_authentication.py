@@ -0,0 +1,87 @@
+''' Test the cached token authentication '''
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+from core.authentication import (
+    CachedTokenAuthentication, get_token_cache, token_cache_key,
+)
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    ''' Test the token lookups are cached and invalidated '''
+    def setUp(self):
+        get_token_cache().clear()
+        self.user = get_user_model().objects.create_user(
+            email='cachedauth@gmail.com',
+            password='cached-pass123',
+            phone_number='0712000111',
+            name='Cache User',
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.auth = CachedTokenAuthentication()
+
+    def test_lookup_is_cached(self):
+        ''' Test the second lookup of a token runs no query '''
+        user, token = self.auth.authenticate_credentials(self.token.key)
+        self.assertEqual(user, self.user)
+
+        with self.assertNumQueries(0):
+            user, token = self.auth.authenticate_credentials(self.token.key)
+        self.assertEqual(user, self.user)
+        self.assertEqual(token, self.token)
+
+    def test_deleted_token_is_invalidated(self):
+        ''' Test a deleted token stops authenticating '''
+        key = self.token.key
+        self.auth.authenticate_credentials(key)
+        self.token.delete()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(key)
+
+    def test_deactivated_user_is_invalidated(self):
+        ''' Test deactivating a user stops their token authenticating '''
+        self.auth.authenticate_credentials(self.token.key)
+        self.user.is_active = False
+        self.user.save()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.token.key)
+
+    def test_changed_user_is_reloaded(self):
+        ''' Test changes to the user are visible on the next request '''
+        self.auth.authenticate_credentials(self.token.key)
+        self.user.name = 'Renamed User'
+        self.user.save()
+
+        user, _ = self.auth.authenticate_credentials(self.token.key)
+        self.assertEqual(user.name, 'Renamed User')
+
+    def test_cache_holds_no_secrets(self):
+        ''' Test neither the raw token nor the password hash is cached '''
+        self.auth.authenticate_credentials(self.token.key)
+
+        cached = repr(get_token_cache().get(token_cache_key(self.token.key)))
+        self.assertNotIn(self.token.key, cached)
+        self.assertNotIn(self.user.password, cached)
+
+        user, token = self.auth.authenticate_credentials(self.token.key)
+        self.assertEqual(token.key, self.token.key)
+        self.assertEqual(user.email, self.user.email)
+        self.assertTrue(user.check_password('cached-pass123'))
+
+    def test_invalidated_again_on_commit(self):
+        ''' Test an entry cached before the writer commits is dropped '''
+        key = self.token.key
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+            # A concurrent request still seeing the active user.
+            get_token_cache().set(token_cache_key(key), {'user': []})
+
+        self.assertIsNone(get_token_cache().get(token_cache_key(key)))
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(key)
@@ -1,39 +1,247 @@
-from unittest.mock import patch, call
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+import shutil
+import tempfile
+import threading
+import time
+from io import StringIO
+from unittest.mock import patch
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
-from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.core.management.base import CommandError
+from django.db.utils import DatabaseError, OperationalError
+from django.test import SimpleTestCase, TestCase, override_settings
 
+from core.models import Recipe
 
-@patch('django.core.management.base.BaseCommand.check')
+
+@patch('core.management.commands.wait_for_db.connections')
 class CommandTests(SimpleTestCase):
     """Test the wait_for_db management command."""
 
-    def test_wait_for_db_ready(self, patched_check):
+    def test_wait_for_db_ready(self, patched_connections):
         """Test waiting for database when the database is available."""
-        # Mock check to return True (database ready)
-        patched_check.return_value = True
+        connection = patched_connections.__getitem__.return_value
 
         # Call the command
         call_command('wait_for_db')
 
-        # Ensure check is called exactly once with the 'default' database
-        patched_check.assert_called_once_with(databases=['default'])
+        # Ensure the 'default' database is connected to exactly once
+        patched_connections.__getitem__.assert_called_once_with('default')
+        connection.ensure_connection.assert_called_once_with()
+
+        # Ensure the connection is handed back
+        connection.close.assert_called_once_with()
 
-    @patch('time.sleep', return_value=None)
-    def test_wait_for_db_delay(self, patched_sleep, patched_check):
+    @patch('core.management.commands.wait_for_db.sleep', return_value=None)
+    def test_wait_for_db_delay(self, patched_sleep, patched_connections):
         """Test waiting for database when it raises OperationalError at first.
         """
-        # Mock check to raise OperationalError the first two times,then succeed
-        patched_check.side_effect = [OperationalError, OperationalError, True]
+        connection = patched_connections.__getitem__.return_value
+        # Fail to connect the first two times, then succeed
+        connection.ensure_connection.side_effect = [
+            OperationalError, OperationalError, None
+        ]
 
         # Call the command
         call_command('wait_for_db')
 
-        # Ensure check is called three times
-        self.assertEqual(patched_check.call_count, 3)
-
-        # Ensure check is called with the 'default' database
-        patched_check.assert_has_calls([call(databases=['default'])] * 3)
+        # Ensure connecting is tried three times
+        self.assertEqual(connection.ensure_connection.call_count, 3)
 
         # Ensure time.sleep is called twice (between failures)
         self.assertEqual(patched_sleep.call_count, 2)
+
+
+class BenchmarkQueriesTests(SimpleTestCase):
+    """Test the benchmark_queries management command."""
+
+    @patch('core.management.commands.benchmark_queries.connection')
+    def test_benchmark_requires_postgres(self, patched_connection):
+        """Test the benchmark refuses to run on other databases."""
+        patched_connection.vendor = 'sqlite'
+
+        with self.assertRaises(CommandError):
+            call_command('benchmark_queries')
+
+    @patch('core.management.commands.benchmark_queries.connection')
+    def test_benchmark_requires_two_runs(self, patched_connection):
+        """Test the benchmark needs two runs to compute percentiles."""
+        patched_connection.vendor = 'postgresql'
+
+        with self.assertRaises(CommandError):
+            call_command('benchmark_queries', runs=1)
+
+
+class BenchmarkQueriesDatabaseTests(TestCase):
+    """Test benchmark_queries against a small seeded dataset."""
+
+    def test_benchmark_reports_each_query(self):
+        """Test a plan and percentiles are printed per query."""
+        out = StringIO()
+
+        call_command(
+            'benchmark_queries', seed=True, users=1, recipes_per_user=10,
+            attrs_per_user=3, links_per_recipe=2, runs=3, stdout=out,
+        )
+
+        output = out.getvalue()
+        self.assertEqual(output.count('over 3 runs'), 18)
+        self.assertNotIn('Skipped', output)
+
+
+class BenchmarkRenderersTests(SimpleTestCase):
+    """Test the benchmark_renderers management command."""
+
+    def test_benchmark_reports_each_size(self):
+        """Test a line is printed per renderer and response size."""
+        out = StringIO()
+
+        call_command(
+            'benchmark_renderers', sizes=[1, 10], runs=1, stdout=out
+        )
+
+        lines = out.getvalue().splitlines()
+        self.assertIn('json (orjson)', lines[1])
+        self.assertEqual(sum('10 recipes' in line for line in lines),
+                         len(lines) // 2)
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    """Answer every GET over a keep-alive connection."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        status = 200 if self.headers['Authorization'] == 'Token abc' else 401
+        self.send_response(status)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def log_message(self, *args):
+        pass
+
+
+class LoadTestTests(SimpleTestCase):
+    """Test the load_test management command."""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+        threading.Thread(target=self.server.serve_forever).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f'http://127.0.0.1:{self.server.server_port}/api/'
+
+    def test_reports_each_concurrency_level(self):
+        """Test a line is printed per level with no failed requests."""
+        out = StringIO()
+
+        call_command(
+            'load_test', self.url, token='abc', concurrency=[1, 4],
+            duration=0.2, stdout=out,
+        )
+
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertEqual([line.split()[0] for line in lines[1:]], ['1', '4'])
+        self.assertTrue(all(line.split()[-1] == '0' for line in lines[1:]))
+
+    def test_counts_failed_requests(self):
+        """Test non 200 responses are reported as errors."""
+        out = StringIO()
+
+        call_command(
+            'load_test', self.url, concurrency=[2], duration=0.2, stdout=out,
+        )
+
+        requests, errors = out.getvalue().splitlines()[1].split()[1::4]
+        self.assertEqual(requests, errors)
+
+    def test_refuses_https(self):
+        """Test only plain HTTP endpoints are accepted."""
+        with self.assertRaises(CommandError):
+            call_command('load_test', 'https://example.com/')
+
+
+class ProcessImageUploadsTests(SimpleTestCase):
+    """Test the process_image_uploads worker loop."""
+
+    @patch('core.management.commands.process_image_uploads.sleep')
+    @patch('core.management.commands.process_image_uploads'
+           '.claim_next_variant_job', return_value=None)
+    @patch('core.management.commands.process_image_uploads'
+           '.claim_next_upload')
+    def test_worker_survives_errors(self, patched_claim, _, patched_sleep):
+        """Test an error between jobs is logged and polling goes on."""
+        patched_claim.side_effect = [DatabaseError('gone'), None]
+        patched_sleep.side_effect = [None, KeyboardInterrupt]
+        err = StringIO()
+
+        with self.assertRaises(KeyboardInterrupt):
+            call_command('process_image_uploads', stderr=err)
+
+        self.assertIn('gone', err.getvalue())
+        self.assertEqual(patched_claim.call_count, 2)
+
+
+class CollectOrphanedMediaTests(TestCase):
+    """Test the collect_orphaned_media management command."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        user = get_user_model().objects.create_user(
+            'gc@example.com', 'testpass123', phone_number='0700000000'
+        )
+        Recipe.objects.create(
+            user=user, title='Kept', time_in_minutes=5, price=1,
+            image='uploads/recipe/kept.jpg',
+        )
+
+    def create_file(self, name, size=10, age=7200):
+        """Write a file below MEDIA_ROOT modified age seconds ago."""
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(b'x' * size)
+        modified = time.time() - age
+        os.utime(path, (modified, modified))
+        return path
+
+    def test_deletes_only_old_orphans(self):
+        """Test referenced and recent files and their variants are kept."""
+        kept = [
+            self.create_file('uploads/recipe/kept.jpg'),
+            self.create_file('uploads/recipe/variants/kept/160.jpg'),
+            self.create_file('uploads/recipe/recent.jpg', age=60),
+        ]
+        orphans = [
+            self.create_file('uploads/recipe/orphan.jpg', size=100),
+            self.create_file('uploads/recipe/variants/orphan/160.jpg'),
+            self.create_file('uploads/pending/stale.png', size=5),
+        ]
+        out = StringIO()
+
+        call_command('collect_orphaned_media', batch_size=2, stdout=out)
+
+        for path in kept:
+            self.assertTrue(os.path.exists(path))
+        for path in orphans:
+            self.assertFalse(os.path.exists(path))
+        self.assertFalse(os.path.exists(os.path.join(
+            self.media_root, 'uploads/recipe/variants/orphan'
+        )))
+        self.assertIn('Reclaimed 115 bytes in 3 files', out.getvalue())
+
+    def test_dry_run_keeps_files(self):
+        """Test a dry run only reports the orphans."""
+        orphan = self.create_file('uploads/recipe/orphan.jpg', size=100)
+        out = StringIO()
+
+        call_command('collect_orphaned_media', dry_run=True, stdout=out)
+
+        self.assertTrue(os.path.exists(orphan))
+        self.assertIn('Would reclaim 100 bytes in 1 files', out.getvalue())
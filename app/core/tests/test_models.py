@@ -1,11 +1,13 @@
 ''' Test the models '''
 
+import hashlib
 import random
 from decimal import Decimal
 
+from django.core.files.base import ContentFile
 from django.test import TestCase
 from django.contrib.auth import get_user_model
-from unittest.mock import patch
+from unittest.mock import Mock
 
 from core import models
 
@@ -120,10 +122,10 @@ class ModelTests(TestCase):
 
         self.assertEqual(str(ingredient), ingredient.name)
 
-    @patch('core.models.uuid.uuid4')
-    def test_recipe_file_name_uuid(self, mock_uuid):
-        ''' Test generating the image path '''
-        uuid = 'test-uuid'
-        mock_uuid.return_value = uuid
-        file_path = models.recipe_image_file_path(None, 'example.jpg')
-        self.assertEqual(file_path, f'uploads/recipe/{uuid}.jpg')
+    def test_recipe_file_name_content_hash(self):
+        ''' Test generating the image path from the image content '''
+        content = ContentFile(b'recipe image bytes')
+        digest = hashlib.sha256(b'recipe image bytes').hexdigest()
+        instance = Mock(image=content)
+        file_path = models.recipe_image_file_path(instance, 'example.JPG')
+        self.assertEqual(file_path, f'uploads/recipe/{digest}.jpg')
@@ -0,0 +1,89 @@
+''' Test the orjson and MessagePack renderers and parsers '''
+from datetime import datetime, timezone
+from decimal import Decimal
+from io import BytesIO
+from unittest import skipUnless
+import uuid
+
+from django.test import SimpleTestCase
+from django.utils.translation import gettext_lazy
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.serializer_helpers import ReturnDict
+
+from core import parsers, renderers
+
+
+PAYLOAD = {
+    'id': 1,
+    'title': 'Crème brûlée \u2028 "torched" \u2029',
+    'price': Decimal('12.50'),
+    'created_at': datetime(2024, 5, 1, 12, 30, 15, 123456, timezone.utc),
+    'token': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+    'label': gettext_lazy('Recipe'),
+    'tags': [ReturnDict({'id': 2, 'name': 'Dessert'}, serializer=None)],
+    'variants': {320: 'a.jpg'},
+    'image': None,
+}
+
+
+class ORJSONTests(SimpleTestCase):
+    ''' Test the orjson renderer and parser match the DRF classes '''
+
+    def test_renders_same_bytes_as_drf(self):
+        ''' Test the output is byte for byte the stdlib renderer's '''
+        self.assertEqual(
+            renderers.ORJSONRenderer().render(PAYLOAD),
+            JSONRenderer().render(PAYLOAD),
+        )
+
+    def test_indent_falls_back_to_drf(self):
+        ''' Test pretty printing keeps the requested indent '''
+        media_type = 'application/json; indent=4'
+
+        self.assertEqual(
+            renderers.ORJSONRenderer().render(PAYLOAD, media_type),
+            JSONRenderer().render(PAYLOAD, media_type),
+        )
+
+    def test_parses_same_data_as_drf(self):
+        ''' Test request bodies parse as they do with the stdlib parser '''
+        body = '{"title": "Crème", "price": 1.5, "tags": [{"id": 2}]}'
+
+        self.assertEqual(
+            parsers.ORJSONParser().parse(BytesIO(body.encode())),
+            JSONParser().parse(BytesIO(body.encode())),
+        )
+
+    def test_invalid_json_is_parse_error(self):
+        ''' Test malformed bodies and NaN are rejected with a 400 '''
+        for body in (b'{"title": ', b'{"price": NaN}'):
+            with self.assertRaises(ParseError):
+                parsers.ORJSONParser().parse(BytesIO(body))
+
+
+@skipUnless(renderers.msgpack, 'msgpack is not installed')
+class MessagePackTests(SimpleTestCase):
+    ''' Test the optional MessagePack renderer and parser '''
+
+    def test_round_trip(self):
+        ''' Test rendered data parses back to its JSON representation '''
+        # Request bodies may only use string keys, as in the API output.
+        payload = {
+            key: value for key, value in PAYLOAD.items() if key != 'variants'
+        }
+        content = renderers.MessagePackRenderer().render(payload)
+
+        self.assertEqual(
+            parsers.MessagePackParser().parse(BytesIO(content)),
+            parsers.ORJSONParser().parse(
+                BytesIO(renderers.ORJSONRenderer().render(payload))
+            ),
+        )
+
+    def test_invalid_body_is_parse_error(self):
+        ''' Test truncated bodies are rejected with a 400 '''
+        with self.assertRaises(ParseError):
+            parsers.MessagePackParser().parse(BytesIO(b'\x82\xa2id'))
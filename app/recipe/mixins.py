@@ -0,0 +1,364 @@
+''' Reusable behaviour for the Recipe viewsets '''
+from datetime import datetime, timezone
+from functools import update_wrapper
+import hashlib
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Count, Max
+from django.http import Http404, HttpResponse
+from django.shortcuts import aget_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from core.cache import (
+    get_data_version, get_response_cache, record_hit, record_miss
+)
+
+
+class CachedListMixin:
+    """Serve list responses from the per user response cache.
+
+    Entries are keyed on the user's data version, which the core signals
+    bump on every write, so stale entries are simply never read again.
+    Other read only actions over the user's data, such as aggregates,
+    can be cached the same way with _get_cached_response().
+    """
+
+    def _get_list_cache_key(self, request):
+        ''' Return the cache key of this list request '''
+        uri = hashlib.sha256(
+            request.build_absolute_uri().encode()
+        ).hexdigest()
+        version = get_data_version(request.user.id)
+        return (
+            f'list:{request.user.id}:{version}:'
+            f'{request.accepted_media_type}:{uri}'
+        )
+
+    def _get_cached(self, request):
+        ''' Return the cached response, or None and remember its key '''
+        key = self._get_list_cache_key(request)
+        cached = get_response_cache().get(key)
+        if cached is None:
+            record_miss()
+            self._list_cache_key = key
+            return None
+        content, content_type = cached
+        record_hit(len(content))
+        return HttpResponse(content, content_type=content_type)
+
+    def _get_cached_response(self, request, handler, *args, **kwargs):
+        ''' Return the cached response or the handler's, to be cached '''
+        # The browsable API embeds per request forms and tokens.
+        if request.accepted_renderer.format != 'api':
+            cached = self._get_cached(request)
+            if cached is not None:
+                return cached
+        return handler(request, *args, **kwargs)
+
+    async def _aget_cached_response(self, request, handler, *args, **kwargs):
+        ''' The async counterpart of _get_cached_response() '''
+        if request.accepted_renderer.format != 'api':
+            cached = await sync_to_async(self._get_cached)(request)
+            if cached is not None:
+                return cached
+        return await handler(request, *args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        ''' Return the cached list or build it and remember to cache it '''
+        return self._get_cached_response(
+            request, super().list, *args, **kwargs
+        )
+
+    async def alist(self, request, *args, **kwargs):
+        ''' The async counterpart of list() '''
+        return await self._aget_cached_response(
+            request, super().alist, *args, **kwargs
+        )
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        ''' Store freshly built list responses in the cache '''
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        key = getattr(self, '_list_cache_key', None)
+        if key is not None and response.status_code == 200:
+            response.render()
+            get_response_cache().set(
+                key, (response.content, response['Content-Type'])
+            )
+        return response
+
+
+class ConditionalGetMixin:
+    """Answer conditional GETs without running the serializer.
+
+    The validators come from one aggregate over the requested recipes,
+    max(updated_at) and the row count, combined with the user's data
+    version. The version catches writes that leave updated_at alone,
+    such as renaming a tag or unlinking an ingredient. The aggregate
+    catches writes that skip the signals, such as queryset.update().
+    """
+
+    def _get_stats_query(self, queryset):
+        ''' Return the rows and aggregates the validators come from '''
+        return queryset.order_by().values('id', 'updated_at'), {
+            'last_modified': Max('updated_at'),
+            'count': Count('*'),
+        }
+
+    def _make_validators(self, stats, version, weak):
+        ''' Return the ETag, Last-Modified timestamp and row count '''
+        last_modified = datetime.fromtimestamp(version / 1e9, timezone.utc)
+        if stats['last_modified'] is not None:
+            last_modified = max(last_modified, stats['last_modified'])
+        digest = hashlib.sha256(
+            f"{stats['count']}:{stats['last_modified']}:{version}:"
+            f"{self.request.accepted_media_type}".encode()
+        ).hexdigest()[:32]
+        etag = f'W/"{digest}"' if weak else f'"{digest}"'
+        return etag, int(last_modified.timestamp()), stats['count']
+
+    def _get_validators(self, queryset, weak):
+        ''' Return the ETag, Last-Modified and row count of a queryset '''
+        rows, aggregates = self._get_stats_query(queryset)
+        return self._make_validators(
+            rows.aggregate(**aggregates),
+            get_data_version(self.request.user.id), weak,
+        )
+
+    async def _aget_validators(self, queryset, weak):
+        ''' The async counterpart of _get_validators() '''
+        rows, aggregates = self._get_stats_query(queryset)
+        stats = await rows.aaggregate(**aggregates)
+        version = await sync_to_async(get_data_version)(self.request.user.id)
+        return self._make_validators(stats, version, weak)
+
+    def _add_validators(self, response, etag, last_modified):
+        ''' Return the response with its validators '''
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def _get_conditional_response(self, etag, last_modified, weak, count):
+        ''' Return a 304 when the client copy is fresh, else None '''
+        if not weak and not count:
+            # Strong validators describe one recipe, a missing one has no
+            # representation to match, not even If-None-Match: *.
+            return None
+        return get_conditional_response(
+            self.request, etag=etag, last_modified=last_modified
+        )
+
+    def _conditional_get(self, queryset, weak, handler, *args, **kwargs):
+        ''' Return a 304 when the client copy is fresh, else the handler '''
+        etag, last_modified, count = self._get_validators(queryset, weak)
+        response = self._get_conditional_response(
+            etag, last_modified, weak, count
+        )
+        if response is None:
+            response = handler(self.request, *args, **kwargs)
+        return self._add_validators(response, etag, last_modified)
+
+    async def _aconditional_get(self, queryset, weak, handler, *args,
+                                **kwargs):
+        ''' The async counterpart of _conditional_get() '''
+        etag, last_modified, count = await self._aget_validators(
+            queryset, weak
+        )
+        response = self._get_conditional_response(
+            etag, last_modified, weak, count
+        )
+        if response is None:
+            response = await handler(self.request, *args, **kwargs)
+        return self._add_validators(response, etag, last_modified)
+
+    def _get_object_queryset(self, kwargs):
+        ''' Return the queryset of the requested object, None if malformed '''
+        try:
+            return self.get_queryset().filter(pk=kwargs[self.lookup_field])
+        except (TypeError, ValueError):
+            return None
+
+    def list(self, request, *args, **kwargs):
+        ''' List with a weak validator over the filtered recipes '''
+        return self._conditional_get(
+            self.filter_queryset(self.get_queryset()),
+            True, super().list, *args, **kwargs
+        )
+
+    async def alist(self, request, *args, **kwargs):
+        ''' The async counterpart of list() '''
+        return await self._aconditional_get(
+            self.filter_queryset(self.get_queryset()),
+            True, super().alist, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        ''' Retrieve with a strong validator over the one recipe '''
+        queryset = self._get_object_queryset(kwargs)
+        if queryset is None:
+            # Let get_object() turn the malformed id into a 404.
+            return super().retrieve(request, *args, **kwargs)
+        return self._conditional_get(
+            queryset, False, super().retrieve, *args, **kwargs
+        )
+
+    async def aretrieve(self, request, *args, **kwargs):
+        ''' The async counterpart of retrieve() '''
+        queryset = self._get_object_queryset(kwargs)
+        if queryset is None:
+            return await super().aretrieve(request, *args, **kwargs)
+        return await self._aconditional_get(
+            queryset, False, super().aretrieve, *args, **kwargs
+        )
+
+
+class SparseFieldsMixin:
+    """Let clients pick the serializer fields with ?fields= and ?omit=.
+
+    Both take comma separated field names, fields keeps only those and
+    omit drops them. The names are passed to the serializer in its
+    context, views read get_sparse_fields() to load less as well.
+    """
+
+    # Read only actions whose output can be trimmed.
+    sparse_fields_actions = ['list', 'retrieve', 'export']
+
+    def _parse_field_names(self, param, available):
+        ''' Return the field names of a parameter, rejecting unknown ones '''
+        names = {
+            name.strip()
+            for name in self.request.query_params[param].split(',')
+            if name.strip()
+        }
+        unknown = names.difference(available)
+        if unknown:
+            raise ValidationError({
+                param: f'Unknown fields {", ".join(sorted(unknown))}, '
+                       f'expected some of {", ".join(available)}.'
+            })
+        return names
+
+    def get_sparse_fields(self):
+        ''' Return the names of the requested fields, None for all '''
+        params = self.request.query_params
+        if self.action not in self.sparse_fields_actions or not (
+                'fields' in params or 'omit' in params):
+            return None
+        available = list(self.get_serializer_class().Meta.fields)
+        fields = set(available)
+        if 'fields' in params:
+            fields = self._parse_field_names('fields', available)
+        if 'omit' in params:
+            fields -= self._parse_field_names('omit', available)
+        return fields
+
+    def get_serializer_context(self):
+        ''' Pass the requested fields on to the serializer '''
+        context = super().get_serializer_context()
+        context['fields'] = self.get_sparse_fields()
+        return context
+
+
+class AsyncReadMixin:
+    """Serve the read actions as coroutines when running under ASGI.
+
+    With settings.ASYNC_READ_VIEWS on, as_view() returns a coroutine
+    view. Requests routed to an action with an a<action> counterpart run
+    it on the event loop and query through the async ORM. Any other
+    request runs the regular view in a thread, as Django runs every sync
+    view under ASGI. The counterparts here mirror ListModelMixin and
+    RetrieveModelMixin, the mixins above wrap them like their sync
+    versions.
+    """
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        ''' Return a coroutine view when async reads are enabled '''
+        view = super().as_view(actions, **initkwargs)
+        async_methods = {
+            method for method, action in actions.items()
+            if hasattr(cls, f'a{action}')
+        }
+        if not settings.ASYNC_READ_VIEWS or not async_methods:
+            return view
+        sync_view = sync_to_async(view)
+
+        async def async_view(request, *args, **kwargs):
+            if request.method.lower() not in async_methods:
+                return await sync_view(request, *args, **kwargs)
+            # Set up the instance as ViewSetMixin.as_view() does.
+            self = cls(**initkwargs)
+            self.action_map = actions
+            for method, action in actions.items():
+                setattr(self, method, getattr(self, action))
+            self.request = request
+            self.args = args
+            self.kwargs = kwargs
+            return await self.adispatch(request, *args, **kwargs)
+
+        return update_wrapper(async_view, view)
+
+    async def adispatch(self, request, *args, **kwargs):
+        ''' The async counterpart of APIView.dispatch() '''
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            # Authentication reads the token cache and the database.
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            handler = getattr(self, f'a{self.action}')
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        # Finalizing renders and may store the response in the cache.
+        self.response = await sync_to_async(self.finalize_response)(
+            request, response, *args, **kwargs
+        )
+        return self.response
+
+    async def _aserialize(self, instances):
+        ''' Return the representation of the fetched instances '''
+        serializer = self.get_serializer(instances, many=True)
+        if hasattr(serializer, 'adata'):
+            return await serializer.adata()
+        # Model serializers only read the rows and their prefetches.
+        return serializer.data
+
+    async def alist(self, request, *args, **kwargs):
+        ''' The async counterpart of ListModelMixin.list() '''
+        queryset = self.filter_queryset(self.get_queryset())
+        page = None
+        if self.paginator is not None:
+            page = await self.paginator.apaginate_queryset(
+                queryset, request, view=self
+            )
+        if page is not None:
+            return self.get_paginated_response(await self._aserialize(page))
+        return Response(
+            await self._aserialize([obj async for obj in queryset])
+        )
+
+    async def aget_object(self):
+        ''' The async counterpart of GenericAPIView.get_object() '''
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        filter_kwargs = {self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        try:
+            obj = await aget_object_or_404(queryset, **filter_kwargs)
+        except (TypeError, ValueError, DjangoValidationError):
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    async def aretrieve(self, request, *args, **kwargs):
+        ''' The async counterpart of RetrieveModelMixin.retrieve() '''
+        instance = await self.aget_object()
+        return Response(self.get_serializer(instance).data)
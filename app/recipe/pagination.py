@@ -0,0 +1,154 @@
+''' The Recipe pagination classes '''
+from functools import reduce
+import json
+import operator
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+
+
+class RecipeCursorPagination(CursorPagination):
+    ''' Opaque keyset pagination over the recipes, newest first
+
+    Each page is a range scan on the (user, -id) index, no offset or
+    count queries are issued however deep the client pages. The cursor
+    position holds the value of every ordering column, so orderings on
+    non unique columns that end on the id, such as a search rank, page
+    through ties without skipping or repeating rows.
+    '''
+    ordering = '-id'
+    page_size = settings.RECIPE_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.RECIPE_MAX_PAGE_SIZE
+
+    def get_ordering(self, request, queryset, view):
+        ''' Keep the ordering of the view, such as by search rank '''
+        if queryset.query.order_by:
+            return tuple(queryset.query.order_by)
+        return super().get_ordering(request, queryset, view)
+
+    def _get_position_from_instance(self, instance, ordering):
+        ''' Return the values of every ordering column as JSON '''
+        values = []
+        for order in ordering:
+            field_name = order.lstrip('-')
+            if isinstance(instance, dict):
+                values.append(instance[field_name])
+            else:
+                values.append(getattr(instance, field_name))
+        return json.dumps(values, cls=DjangoJSONEncoder)
+
+    def _get_position_filter(self, position, reverse):
+        ''' Return the row comparison selecting rows after a position
+
+        (a, b) after (x, y) expands to a > x OR (a = x AND b > y), with
+        the comparison flipped for descending columns. The redundant
+        a >= x is added as it is the only part an index scan on
+        (user, a, b) can start from, the rest is filtered.
+        '''
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        conditions = []
+        equal = Q()
+        for order, value in zip(self.ordering, values):
+            field_name = order.lstrip('-')
+            lookup = 'lt' if order.startswith('-') != reverse else 'gt'
+            conditions.append(equal & Q(**{f'{field_name}__{lookup}': value}))
+            equal &= Q(**{field_name: value})
+        if len(conditions) == 1:
+            return conditions[0]
+        first = self.ordering[0]
+        lookup = 'lte' if first.startswith('-') != reverse else 'gte'
+        return Q(**{f'{first.lstrip("-")}__{lookup}': values[0]}) & reduce(
+            operator.or_, conditions
+        )
+
+    def _get_page_queryset(self, queryset, request, view=None):
+        ''' Return the page rows to fetch, None when not paginating
+
+        Follows CursorPagination.paginate_queryset, which only compares
+        the first ordering column.
+        '''
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if current_position is not None:
+            queryset = queryset.filter(
+                self._get_position_filter(current_position, reverse)
+            )
+
+        # Fetch one extra row to know whether a following page exists.
+        return queryset[offset:offset + self.page_size + 1]
+
+    def _set_page(self, results):
+        ''' Keep the page of the fetched rows and the links around it '''
+        (offset, reverse, current_position) = self.cursor or (0, False, None)
+        self.page = list(results[:self.page_size])
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(
+                results[-1], self.ordering
+            )
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def paginate_queryset(self, queryset, request, view=None):
+        ''' Return a page of rows, filtering on the full cursor position '''
+        queryset = self._get_page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self._set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        ''' Return a page of rows, read with the async ORM '''
+        queryset = self._get_page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self._set_page([row async for row in queryset])
@@ -0,0 +1,21 @@
+''' The Recipe renderers '''
+from rest_framework.renderers import BaseRenderer
+
+from core.renderers import dumps
+
+
+class NDJSONRenderer(BaseRenderer):
+    ''' Render newline delimited JSON, one document per line '''
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = None
+
+    def render_line(self, data):
+        ''' Return one document as a line of UTF-8 JSON '''
+        return dumps(data) + b'\n'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        ''' Render a non streamed response such as an error as one line '''
+        if data is None:
+            return b''
+        return self.render_line(data)
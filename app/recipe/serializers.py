@@ -1,61 +1,186 @@
 '''
 Serializers for the APIS
 '''
+from collections import defaultdict
+
+from django.db import transaction
+from django.urls import reverse
 
 from rest_framework import serializers
 
-from core.models import Recipe, Tag, Ingredient
+from core.cache import data_changed
+from core.images import variant_names
+from core.models import Recipe, Tag, Ingredient, RecipeImageUpload
+
+
+def _image_variant_urls(name, storage, request):
+    ''' Return the URL of each resized variant of an image keyed by width '''
+    variants = {}
+    for width, variant_name in variant_names(name):
+        url = storage.url(variant_name)
+        variants[str(width)] = (
+            request.build_absolute_uri(url) if request else url
+        )
+    return variants
+
 
+class BaseRecipeAttrSerializer(serializers.ModelSerializer):
+    ''' The base serializer for tags and ingredients '''
 
-class TagSerializer(serializers.ModelSerializer):
+    def validate_name(self, value):
+        ''' Reject renaming onto a name the owner already uses '''
+        if self.instance is None:
+            return value
+        duplicates = self.Meta.model.objects.filter(
+            user=self.instance.user, name=value
+        ).exclude(pk=self.instance.pk)
+        if duplicates.exists():
+            raise serializers.ValidationError(
+                f'{self.Meta.model._meta.verbose_name} with this name '
+                'already exists.'
+            )
+        return value
+
+
+class TagSerializer(BaseRecipeAttrSerializer):
     ''' The Tags serializer '''
     class Meta:
         ''' Serializer for tags '''
         model = Tag
-        fields = ['id', 'name']
-        read_only_fields = ['id']
+        fields = ['id', 'name', 'recipe_count']
+        read_only_fields = ['id', 'recipe_count']
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(BaseRecipeAttrSerializer):
     ''' The Ingredient serializer '''
     class Meta:
         ''' Serializer for Ingredients '''
         model = Ingredient
+        fields = ['id', 'name', 'recipe_count']
+        read_only_fields = ['id', 'recipe_count']
+
+
+class RecipeTagSerializer(TagSerializer):
+    ''' A tag nested in a recipe '''
+    class Meta(TagSerializer.Meta):
+        fields = ['id', 'name']
+
+
+class RecipeIngredientSerializer(IngredientSerializer):
+    ''' An ingredient nested in a recipe '''
+    class Meta(IngredientSerializer.Meta):
         fields = ['id', 'name']
-        read_only_fields = ['id']
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+    ''' Create many recipes with set based inserts '''
+
+    def _link(self, through, field_name, recipes, items, objects):
+        ''' Insert the through rows linking recipes to their objects '''
+        by_name = {obj.name: obj for obj in objects}
+        through.objects.bulk_create([
+            through(recipe_id=recipe.pk, **{field_name: by_name[name].pk})
+            for recipe, recipe_items in zip(recipes, items)
+            for name in dict.fromkeys(item['name'] for item in recipe_items)
+        ])
+
+    def create(self, validated_data):
+        ''' Insert the recipes, their tags and ingredients and the links '''
+        user = self.context['request'].user
+        recipes, tags, ingredients = [], [], []
+        for item in validated_data:
+            item = dict(item)
+            tags.append(item.pop('tags', []))
+            ingredients.append(item.pop('ingredients', []))
+            recipes.append(Recipe(user=user, **item))
+        with transaction.atomic():
+            recipes = Recipe.objects.bulk_create(recipes)
+            for model, through, items in (
+                (Tag, Recipe.tags.through, tags),
+                (Ingredient, Recipe.ingredients.through, ingredients),
+            ):
+                objects = self.child._get_or_create_objects(
+                    model, [item for group in items for item in group]
+                )
+                self._link(
+                    through, f'{model._meta.model_name}_id',
+                    recipes, items, objects,
+                )
+            # Bulk inserts send no model signals.
+            data_changed(user.pk)
+        return recipes
 
 
 class RecipeSerializer(serializers.ModelSerializer):
     ''' Serializer for the Recipe '''
-    tags = TagSerializer(many=True, required=False)
-    ingredients = IngredientSerializer(many=True, required=False)
+    tags = RecipeTagSerializer(many=True, required=False)
+    ingredients = RecipeIngredientSerializer(many=True, required=False)
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
         fields = [
             'id', 'title', 'time_in_minutes',
-            'price', 'link', 'description', 'tags', 'ingredients', 'image'
+            'price', 'link', 'description', 'tags', 'ingredients', 'image',
+            'image_variants'
                 ]
         read_only_fields = ['id']
+        list_serializer_class = RecipeListSerializer
 
-    def _get_or_create_tag(self, tags, recipe):
-        ''' Create or get a tag'''
+    def get_fields(self):
+        ''' Return the fields, trimmed to those the view was asked for '''
+        fields = super().get_fields()
+        requested = self.context.get('fields')
+        if requested is None:
+            return fields
+        return {
+            name: field for name, field in fields.items() if name in requested
+        }
+
+    def get_image_variants(self, obj) -> dict[str, str]:
+        ''' Return the URL of each resized variant keyed by width '''
+        if not obj.image:
+            return {}
+        return _image_variant_urls(
+            obj.image.name, obj.image.storage, self.context.get('request')
+        )
+
+    def _get_or_create_objects(self, model, items):
+        ''' Return the user's objects for the items, creating missing ones '''
         auth_user = self.context['request'].user
-        for tag in tags:
-            tag_object, create = Tag.objects.get_or_create(
-                user=auth_user,**tag
+        names = list(dict.fromkeys(item['name'] for item in items))
+        if not names:
+            return []
+        objects = {
+            obj.name: obj
+            for obj in model.objects.filter(user=auth_user, name__in=names)
+        }
+        missing = [
+            model(user=auth_user, name=name)
+            for name in names if name not in objects
+        ]
+        if missing:
+            # A concurrent request may insert the same names first, the
+            # conflict clause turns that race into a no-op that still
+            # returns the ids.
+            created = model.objects.bulk_create(
+                missing,
+                update_conflicts=True,
+                unique_fields=['user', 'name'],
+                update_fields=['name'],
             )
-            recipe.tags.add(tag_object)
+            objects.update((obj.name, obj) for obj in created)
+        return [objects[name] for name in names]
+
+    def _get_or_create_tag(self, tags, recipe):
+        ''' Create or get the tags and add them to the recipe '''
+        recipe.tags.add(*self._get_or_create_objects(Tag, tags))
 
     def _get_or_create_ingredient(self, ingredients, recipe):
         ''' Create the ingredients and add to recipe '''
-        auth_user = self.context['request'].user
-        for ingredient in ingredients:
-            ingredient_obj, create = Ingredient.objects.get_or_create(
-                user=auth_user,
-                **ingredient
-            )
-            recipe.ingredients.add(ingredient_obj)
+        recipe.ingredients.add(
+            *self._get_or_create_objects(Ingredient, ingredients)
+        )
 
     def create(self, validated_data):
         ''' Create a recipe '''
@@ -66,23 +191,179 @@ class RecipeSerializer(serializers.ModelSerializer):
         self._get_or_create_ingredient(ingredients_data, recipe)
         return recipe
 
+    def _set_related(self, manager, model, items):
+        ''' Link exactly the given items, touching only changed links '''
+        objects = self._get_or_create_objects(model, items)
+        current_ids = set(
+            manager.through.objects.filter(
+                **{manager.source_field_name: manager.instance}
+            ).values_list(f'{manager.target_field_name}_id', flat=True)
+        )
+        removed_ids = current_ids - {obj.pk for obj in objects}
+        added = [obj for obj in objects if obj.pk not in current_ids]
+        if removed_ids:
+            manager.remove(*removed_ids)
+        if added:
+            manager.add(*added)
+        return bool(removed_ids or added)
+
     def update(self, instance, validated_data):
         ''' Update the recipe'''
         tags = validated_data.pop('tags', None)
         ingredients = validated_data.pop('ingredients', None)
+        links_changed = False
         if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tag(tags, instance)
+            links_changed |= self._set_related(instance.tags, Tag, tags)
 
         if ingredients is not None:
-            instance.ingredients.clear()
-            self._get_or_create_ingredient(ingredients, instance)
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
+            links_changed |= self._set_related(
+                instance.ingredients, Ingredient, ingredients
+            )
+        changed_fields = [
+            attr for attr, value in validated_data.items()
+            if getattr(instance, attr) != value
+        ]
+        for attr in changed_fields:
+            setattr(instance, attr, validated_data[attr])
+        if changed_fields or links_changed:
+            instance.save(update_fields=[*changed_fields, 'updated_at'])
         return instance
 
 
+class RecipeSearchSerializer(RecipeSerializer):
+    ''' Recipe serializer adding the rank and snippet of a search '''
+    rank = serializers.FloatField(source='search_rank', read_only=True)
+    highlight = serializers.CharField(
+        source='search_highlight', read_only=True
+    )
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ['rank', 'highlight']
+
+
+class RecipeRowSerializer:
+    """Render recipe rows from .values() for the read only list.
+
+    The output matches the given RecipeSerializer class without running
+    the field machinery for every value. Columns are copied as they are,
+    the price column already holds two decimal places, and the tags and
+    ingredients come from one query per relation of (recipe, id, name)
+    tuples in the order of the recipe prefetches.
+    """
+
+    # Row keys of the fields not named after a column.
+    sources = {'rank': 'search_rank', 'highlight': 'search_highlight'}
+
+    def __init__(self, rows, serializer_class, context):
+        self.rows = rows
+        self.context = context
+        requested = context.get('fields')
+        self.fields = [
+            name for name in serializer_class.Meta.fields
+            if requested is None or name in requested
+        ]
+
+    def _get_links(self, field_name, ids):
+        ''' Return the (recipe id, id, name) rows of a relation '''
+        field = Recipe._meta.get_field(field_name)
+        source = field.m2m_field_name()
+        target = field.m2m_reverse_field_name()
+        return field.remote_field.through.objects.filter(
+            **{f'{source}__in': ids}
+        ).order_by(f'{target}__name', target).values_list(
+            source, target, f'{target}__name'
+        )
+
+    def _group_links(self, links):
+        ''' Return the {id, name} dicts of the links by recipe id '''
+        related = defaultdict(list)
+        for recipe_id, pk, name in links:
+            related[recipe_id].append({'id': pk, 'name': name})
+        return related
+
+    def _get_related_fields(self):
+        ''' Return the names of the requested relations '''
+        if not self.rows:
+            return []
+        return [
+            name for name in ('tags', 'ingredients') if name in self.fields
+        ]
+
+    def _get_converters(self, related):
+        ''' Return a (field name, row to value) function for every field '''
+        request = self.context.get('request')
+        storage = Recipe._meta.get_field('image').storage
+
+        def image(row):
+            if not row['image']:
+                return None
+            url = storage.url(row['image'])
+            return request.build_absolute_uri(url) if request else url
+
+        def image_variants(row):
+            if not row['image']:
+                return {}
+            return _image_variant_urls(row['image'], storage, request)
+
+        converters = []
+        for name in self.fields:
+            if name in ('tags', 'ingredients'):
+                links = related.get(name, {})
+                converters.append(
+                    (name, lambda row, links=links: links.get(row['id'], []))
+                )
+            elif name == 'price':
+                converters.append((name, lambda row: f"{row['price']:f}"))
+            elif name == 'image':
+                converters.append((name, image))
+            elif name == 'image_variants':
+                converters.append((name, image_variants))
+            else:
+                key = self.sources.get(name, name)
+                converters.append((name, lambda row, key=key: row[key]))
+        return converters
+
+    def _to_representation(self, related):
+        ''' Return the representation of every row '''
+        converters = self._get_converters(related)
+        return [
+            {name: convert(row) for name, convert in converters}
+            for row in self.rows
+        ]
+
+    @property
+    def data(self):
+        ''' Return the representation of every row '''
+        ids = [row['id'] for row in self.rows]
+        return self._to_representation({
+            name: self._group_links(self._get_links(name, ids))
+            for name in self._get_related_fields()
+        })
+
+    async def adata(self):
+        ''' Return the representation of every row, with the async ORM '''
+        ids = [row['id'] for row in self.rows]
+        related = {}
+        for name in self._get_related_fields():
+            related[name] = self._group_links(
+                [link async for link in self._get_links(name, ids)]
+            )
+        return self._to_representation(related)
+
+
+class FacetSerializer(serializers.Serializer):
+    ''' The number of matching recipes linked to a tag or ingredient '''
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    count = serializers.IntegerField()
+
+
+class RecipeFacetsSerializer(serializers.Serializer):
+    ''' The tag and ingredient counts of the matching recipes '''
+    tags = FacetSerializer(many=True)
+    ingredients = FacetSerializer(many=True)
+
+
 class RecipeDetailSerializer(RecipeSerializer):
     ''' The recipe details serializer '''
     class Meta(RecipeSerializer.Meta):
@@ -107,3 +388,25 @@ class RecipeImageSerializer(serializers.ModelSerializer):
         fields = ['id', 'image']
         read_only_fields = ['id']
         extra_kwargs = {'image': {'required': 'True'}}
+
+
+class RecipeImageUploadSerializer(serializers.ModelSerializer):
+    ''' Serializer for queueing an image for background processing '''
+    image = serializers.FileField(source='upload', write_only=True)
+    status_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = RecipeImageUpload
+        fields = [
+            'id', 'recipe', 'image', 'status', 'error', 'status_url',
+            'created_at', 'updated_at'
+        ]
+        read_only_fields = [
+            'id', 'recipe', 'status', 'error', 'created_at', 'updated_at'
+        ]
+
+    def get_status_url(self, obj) -> str:
+        ''' Return the URL to poll for the processing status '''
+        url = reverse('recipe:image-upload-detail', args=[obj.id])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
@@ -0,0 +1,158 @@
+''' Test the recipe management commands '''
+from decimal import Decimal
+from io import StringIO
+import os
+import tempfile
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TransactionTestCase
+
+from core.models import Ingredient, Recipe, RecipeImport, Tag
+
+from recipe.management.commands.import_recipes import Command
+from recipe.serializers import RecipeSerializer
+
+
+class ImportRecipesTests(SimpleTestCase):
+    ''' Test the import_recipes management command '''
+
+    @patch('recipe.management.commands.import_recipes.connection')
+    def test_import_requires_postgres(self, patched_connection):
+        ''' Test the import refuses to run on other databases '''
+        patched_connection.vendor = 'sqlite'
+
+        with self.assertRaises(CommandError):
+            call_command('import_recipes', 'recipes.csv', user='a@b.com')
+
+    def test_csv_rows_validated_with_serializer_rules(self):
+        ''' Test CSV rows are parsed and checked like API payloads '''
+        source = StringIO(
+            'title,description,time_in_minutes,price,link,tags,ingredients\n'
+            'Soup,Hot soup,20,4.50,https://soup.com,Dinner| Vegan ,Salt\n'
+            'Broken,No time,,1.00,https://broken.com,,\n'
+        )
+        command = Command(stdout=StringIO(), stderr=StringIO())
+
+        batch = list(command.read_records(source, 'csv'))
+        rows = command.validate_records(RecipeSerializer(), batch)
+
+        self.assertEqual(len(rows), 1)
+        line, data = rows[0]
+        self.assertEqual(line, 2)
+        self.assertEqual(data['price'], Decimal('4.50'))
+        self.assertEqual(
+            [dict(tag) for tag in data['tags']],
+            [{'name': 'Dinner'}, {'name': 'Vegan'}],
+        )
+        self.assertIn('Line 3', command.stderr.getvalue())
+        self.assertIn('time_in_minutes', command.stderr.getvalue())
+
+    def test_ndjson_rows_accept_exported_recipes(self):
+        ''' Test exported lines import and malformed lines are reported '''
+        source = StringIO(
+            '{"id": 7, "title": "Tea", "description": "Black tea",'
+            ' "time_in_minutes": 5, "price": "1.00", "link": "https://t.com",'
+            ' "tags": [], "ingredients": [{"name": "Tea"}],'
+            ' "image": "http://testserver/static/media/tea.jpg",'
+            ' "image_variants": {}}\n'
+            '\n'
+            '{"title": \n'
+        )
+        command = Command(stdout=StringIO(), stderr=StringIO())
+
+        batch = list(command.read_records(source, 'ndjson'))
+        rows = command.validate_records(RecipeSerializer(), batch)
+
+        self.assertEqual([line for line, _ in rows], [1])
+        self.assertNotIn('id', rows[0][1])
+        self.assertIn('Line 3: invalid JSON', command.stderr.getvalue())
+
+
+class ImportRecipesLoadTests(TransactionTestCase):
+    ''' Test the import loads batches into the database and resumes '''
+    # Each batch commits, the staging tables are emptied on commit.
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='importer@gmail.com',
+            password='recipes10202',
+            phone_number='0978230077',
+            name='Import Cheff'
+        )
+        Tag.objects.create(user=self.user, name='Vegan')
+        handle, self.path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(handle, 'w') as source:
+            source.write(
+                'title,description,time_in_minutes,price,link,tags,'
+                'ingredients\n'
+                'Soup,Hot soup,20,4.50,https://soup.com,Dinner|Vegan,Salt\n'
+                'Curry,Spicy,30,7.00,https://curry.com,Vegan,Salt|Rice\n'
+                'Broken,No time,,1.00,https://broken.com,,\n'
+                'Tea,Black tea,5,1.00,https://tea.com,,Tea\n'
+            )
+        self.addCleanup(os.remove, self.path)
+
+    def _import(self, **options):
+        ''' Run the import of the CSV file in batches of two rows '''
+        call_command(
+            'import_recipes', self.path, user=self.user.email, batch_size=2,
+            stdout=StringIO(), stderr=StringIO(), **options
+        )
+
+    def assert_imported(self):
+        ''' Assert the recipes, their links and counts were loaded once '''
+        recipes = Recipe.objects.filter(user=self.user).order_by('id')
+        self.assertEqual(
+            [recipe.title for recipe in recipes], ['Soup', 'Curry', 'Tea']
+        )
+        self.assertEqual(
+            {recipe.title: sorted(recipe.tags.values_list('name', flat=True))
+             for recipe in recipes},
+            {'Soup': ['Dinner', 'Vegan'], 'Curry': ['Vegan'], 'Tea': []},
+        )
+        self.assertEqual(
+            dict(Tag.objects.filter(user=self.user).values_list(
+                'name', 'recipe_count'
+            )),
+            {'Dinner': 1, 'Vegan': 2},
+        )
+        self.assertEqual(
+            dict(Ingredient.objects.filter(user=self.user).values_list(
+                'name', 'recipe_count'
+            )),
+            {'Salt': 2, 'Rice': 1, 'Tea': 1},
+        )
+        progress = RecipeImport.objects.get(user=self.user)
+        self.assertEqual(
+            (progress.rows, progress.imported, progress.rejected), (4, 3, 1)
+        )
+
+    def test_import_loads_recipes_and_links(self):
+        ''' Test a file is loaded and running it again adds nothing '''
+        self._import()
+        self._import()
+
+        self.assert_imported()
+
+    def test_import_resumes_after_last_committed_batch(self):
+        ''' Test a failed import continues without duplicating rows '''
+        load = Command.load
+        loaded = []
+
+        def load_first_batch(command, user, rows):
+            if loaded:
+                raise RuntimeError('Connection lost')
+            loaded.append(rows)
+            load(command, user, rows)
+
+        with patch.object(Command, 'load', load_first_batch):
+            with self.assertRaises(RuntimeError):
+                self._import()
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 2)
+
+        self._import()
+
+        self.assert_imported()
@@ -110,6 +110,7 @@ class PrivateIngredientsAPITests(TestCase):
             user=self.user,
         )
         recipe.ingredients.add(in1)
+        in1.refresh_from_db()
         res = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
 
         s1 = IngredientSerializer(in1)
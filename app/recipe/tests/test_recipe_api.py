@@ -1,23 +1,43 @@
 ''' Test for Recipe APIS '''
 
 from decimal import Decimal
+from io import StringIO
+import json
 import tempfile
 import os
+import shutil
+from unittest.mock import patch
 
-from PIL import Image
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from PIL import Image, features
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
-from rest_framework.test import APIClient
+from rest_framework.test import APIClient, force_authenticate
 
-from core.models import Recipe, Tag, Ingredient
+from core.cache import get_response_cache, get_stats_cache
+from core.db import CONNECTIONS_KEY, record_connection
+from core.images import variant_names
+from core.models import Recipe, Tag, Ingredient, RecipeImageUpload
+from recipe.pagination import RecipeCursorPagination
 from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
+from recipe.views import IngredientViewSet, RecipeViewSet, TagViewSet
 
 
 RECIPE_URL = reverse('recipe:recipe-list')
+RECIPE_BULK_URL = reverse('recipe:recipe-bulk')
+RECIPE_EXPORT_URL = reverse('recipe:recipe-export')
+RECIPE_FACETS_URL = reverse('recipe:recipe-facets')
+CACHE_STATS_URL = reverse('recipe:cache-stats')
+DB_STATS_URL = reverse('recipe:db-stats')
+TAGS_URL = reverse('recipe:tag-list')
+INGREDIENTS_URL = reverse('recipe:ingredient-list')
 
 
 def detail_url(recipe_id):
@@ -30,6 +50,11 @@ def image_upload_url(recipe_id):
     return reverse('recipe:recipe-upload-image', args=[recipe_id])
 
 
+def image_upload_status_url(upload_id):
+    ''' Return the processing status url of a queued image '''
+    return reverse('recipe:image-upload-detail', args=[upload_id])
+
+
 def create_recipe(user, **params):
     ''' Create and return a sample recipe '''
     # Default recipe fields
@@ -98,7 +123,7 @@ class PrivateRecipeAPITests(TestCase):
         serializer = RecipeSerializer(recipes, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_recipe_list_limited_to_user(self):
         ''' Test list the recipes for authenticated user '''
@@ -115,7 +140,38 @@ class PrivateRecipeAPITests(TestCase):
         recipes = Recipe.objects.filter(user=self.user)
         serializer = RecipeSerializer(recipes, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
+
+    def test_recipe_list_is_cursor_paginated(self):
+        ''' Test the recipe list pages through recipes newest first '''
+        recipes = [create_recipe(user=self.user) for _ in range(5)]
+
+        res = self.client.get(RECIPE_URL, {'page_size': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', res.data)
+        self.assertEqual(
+            [recipe['id'] for recipe in res.data['results']],
+            [recipes[4].id, recipes[3].id],
+        )
+        seen = []
+        next_url = res.data['next']
+        while next_url:
+            page = self.client.get(next_url)
+            seen.extend(recipe['id'] for recipe in page.data['results'])
+            next_url = page.data['next']
+        self.assertEqual(seen, [recipes[2].id, recipes[1].id, recipes[0].id])
+
+    def test_recipe_list_page_size_is_capped(self):
+        ''' Test clients cannot ask for pages above the maximum size '''
+        for _ in range(3):
+            create_recipe(user=self.user)
+
+        with patch.object(RecipeCursorPagination, 'max_page_size', 2):
+            res = self.client.get(RECIPE_URL, {'page_size': 1000})
+
+        self.assertEqual(len(res.data['results']), 2)
+        self.assertIsNotNone(res.data['next'])
 
     def test_recipe_detail(self):
         ''' test the recipe details page'''
@@ -230,6 +286,100 @@ class PrivateRecipeAPITests(TestCase):
         # tag_breakfast = Tag.objects.get(user=self.user, name='Breakfast')
         # self.assertIn(tag_breakfast, recipe.tags.all
 
+    def test_create_recipe_with_new_and_existing_tags(self):
+        ''' Test creating a recipe reuses the user's existing tags '''
+        tag_indian = Tag.objects.create(user=self.user, name='Indian')
+        payload = {
+            'title': 'Pongal',
+            'time_in_minutes': 60,
+            'price': '4.50',
+            'description': 'A south Indian breakfast',
+            'link': 'https://samplerecipe.com/pongal.pdf',
+            'tags': [
+                {'name': 'Indian'}, {'name': 'Breakfast'}, {'name': 'Indian'}
+            ],
+        }
+        res = self.client.post(RECIPE_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data['id'])
+        self.assertEqual(recipe.tags.count(), 2)
+        self.assertIn(tag_indian, recipe.tags.all())
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+
+    def test_create_recipe_query_count_is_constant(self):
+        ''' Test creating a recipe resolves ingredients in batches '''
+        Ingredient.objects.create(user=self.user, name='Ingredient 0')
+        payload = {
+            'title': 'Big stew',
+            'time_in_minutes': 90,
+            'price': '25.00',
+            'description': 'A stew with everything',
+            'link': 'https://samplerecipe.com/stew.pdf',
+            'tags': [{'name': 'Dinner'}],
+            'ingredients': [{'name': f'Ingredient {i}'} for i in range(30)],
+        }
+
+        # Insert the recipe, then lookup, upsert, check existing links and
+        # link each relation, then read both relations back.
+        with self.assertNumQueries(11):
+            res = self.client.post(RECIPE_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data['id'])
+        self.assertEqual(recipe.ingredients.count(), 30)
+        self.assertEqual(
+            Ingredient.objects.filter(user=self.user).count(), 30
+        )
+
+    def test_update_recipe_only_changes_modified_links(self):
+        ''' Test updating tags keeps the through rows that did not change '''
+        recipe = create_recipe(
+            user=self.user,
+            tags=[{'name': 'Breakfast'}, {'name': 'Quick'}],
+        )
+        ingredient = Ingredient.objects.create(user=self.user, name='Eggs')
+        recipe.ingredients.add(ingredient)
+        TagLink = Recipe.tags.through
+        kept_link = TagLink.objects.get(recipe=recipe, tag__name='Breakfast')
+        ingredient_link = Recipe.ingredients.through.objects.get(
+            recipe=recipe
+        )
+
+        payload = {'tags': [{'name': 'Breakfast'}, {'name': 'Lunch'}]}
+        res = self.client.patch(
+            detail_url(recipe.id), payload, format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            sorted(tag['name'] for tag in res.data['tags']),
+            ['Breakfast', 'Lunch'],
+        )
+        self.assertTrue(TagLink.objects.filter(id=kept_link.id).exists())
+        self.assertFalse(
+            TagLink.objects.filter(recipe=recipe, tag__name='Quick').exists()
+        )
+        self.assertTrue(
+            Recipe.ingredients.through.objects.filter(
+                id=ingredient_link.id
+            ).exists()
+        )
+
+    def test_update_recipe_without_changes_skips_save(self):
+        ''' Test an update that changes nothing does not write the row '''
+        recipe = create_recipe(user=self.user, tags=[{'name': 'Snack'}])
+        updated_at = recipe.updated_at
+
+        payload = {'title': recipe.title, 'tags': [{'name': 'Snack'}]}
+        res = self.client.patch(
+            detail_url(recipe.id), payload, format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.updated_at, updated_at)
+
     def test_filter_by_tags(self):
         ''' Test filtering recipes by tags '''
         r1 = create_recipe(user=self.user, title='Thai Vegetable Curry')
@@ -250,10 +400,67 @@ class PrivateRecipeAPITests(TestCase):
         s2 = RecipeSerializer(r2)
         s3 = RecipeSerializer(r3)
         s4 = RecipeSerializer(r4)
-        self.assertIn(s1.data, res.data)
-        self.assertIn(s2.data, res.data)
-        self.assertIn(s3.data, res.data)
-        self.assertIn(s4.data, res.data)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertIn(s2.data, res.data['results'])
+        self.assertIn(s3.data, res.data['results'])
+        self.assertIn(s4.data, res.data['results'])
+
+    def test_filter_by_tags_returns_each_recipe_once(self):
+        ''' Test a recipe matching several tags is listed once '''
+        recipe = create_recipe(user=self.user)
+        tags = [
+            Tag.objects.create(user=self.user, name=name)
+            for name in ('Vegan', 'Dinner')
+        ]
+        recipe.tags.add(*tags)
+
+        res = self.client.get(
+            RECIPE_URL, {'tags': ','.join(str(tag.id) for tag in tags)}
+        )
+
+        self.assertEqual(
+            [item['id'] for item in res.data['results']], [recipe.id]
+        )
+
+    def test_filter_matching_all_tags(self):
+        ''' Test match=all keeps the recipes having every tag '''
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        dinner = Tag.objects.create(user=self.user, name='Dinner')
+        both = create_recipe(user=self.user, title='Lentil stew')
+        both.tags.add(vegan, dinner)
+        vegan_only = create_recipe(user=self.user, title='Salad')
+        vegan_only.tags.add(vegan)
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+        both.ingredients.add(salt)
+
+        res = self.client.get(RECIPE_URL, {
+            'tags': f'{vegan.id},{dinner.id},{vegan.id}', 'match': 'all',
+        })
+        res_any = self.client.get(
+            RECIPE_URL, {'tags': f'{vegan.id},{dinner.id}'}
+        )
+        res_ingredient = self.client.get(RECIPE_URL, {
+            'tags': str(vegan.id), 'ingredients': str(salt.id),
+            'match': 'all',
+        })
+
+        self.assertEqual(
+            [item['id'] for item in res.data['results']], [both.id]
+        )
+        self.assertEqual(
+            [item['id'] for item in res_any.data['results']],
+            [vegan_only.id, both.id],
+        )
+        self.assertEqual(
+            [item['id'] for item in res_ingredient.data['results']],
+            [both.id],
+        )
+
+    def test_filter_invalid_match(self):
+        ''' Test an unknown match mode is rejected '''
+        res = self.client.get(RECIPE_URL, {'tags': '1', 'match': 'some'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
     def test_filter_recipe_by_ingredient(self):
         ''' Test filter recipe by ingredients'''
@@ -271,9 +478,607 @@ class PrivateRecipeAPITests(TestCase):
         s2 = RecipeSerializer(r2)
         s3 = RecipeSerializer(r3)
 
-        self.assertIn(s1.data, res.data)
-        self.assertIn(s2.data, res.data)
-        self.assertNotIn(s3.data, res.data)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertIn(s2.data, res.data['results'])
+        self.assertNotIn(s3.data, res.data['results'])
+
+    def test_search_ranks_title_matches_first(self):
+        ''' Test searching orders by rank and highlights the matches '''
+        in_description = create_recipe(
+            user=self.user, title='Weeknight dinner',
+            description='A quick curry with rice',
+        )
+        in_title = create_recipe(
+            user=self.user, title='Green curry',
+            description='Coconut and basil',
+        )
+        create_recipe(
+            user=self.user, title='Pancakes', description='Sweet breakfast'
+        )
+
+        res = self.client.get(RECIPE_URL, {'search': 'curries'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        results = res.data['results']
+        self.assertEqual(
+            [recipe['id'] for recipe in results],
+            [in_title.id, in_description.id],
+        )
+        self.assertGreater(results[0]['rank'], results[1]['rank'])
+        self.assertIn('<mark>curry</mark>', results[1]['highlight'])
+
+    def test_search_combines_with_tag_filter(self):
+        ''' Test the search applies on top of the tag filter '''
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        tagged = create_recipe(user=self.user, title='Vegan chili')
+        tagged.tags.add(tag)
+        create_recipe(user=self.user, title='Beef chili')
+        other = create_recipe(user=self.user, title='Vegan salad')
+        other.tags.add(tag)
+
+        res = self.client.get(
+            RECIPE_URL, {'search': 'chili', 'tags': str(tag.id)}
+        )
+
+        self.assertEqual(
+            [recipe['id'] for recipe in res.data['results']], [tagged.id]
+        )
+
+    def test_search_results_are_paginated(self):
+        ''' Test paging through tied ranks neither skips nor repeats '''
+        for i in range(5):
+            create_recipe(
+                user=self.user, title=f'Soup {i}',
+                description=' '.join(['soup'] * i),
+            )
+
+        res = self.client.get(RECIPE_URL, {'search': 'soup', 'page_size': 2})
+        ids = [recipe['id'] for recipe in res.data['results']]
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            ids += [recipe['id'] for recipe in res.data['results']]
+
+        previous_ids = [recipe['id'] for recipe in res.data['results']]
+        while res.data['previous']:
+            res = self.client.get(res.data['previous'])
+            previous_ids[:0] = [recipe['id'] for recipe in res.data['results']]
+
+        self.assertEqual(len(ids), 5)
+        self.assertEqual(
+            ids,
+            list(Recipe.objects.order_by('-id').values_list('id', flat=True)),
+        )
+        self.assertEqual(previous_ids, ids)
+
+    def test_filter_by_time_and_price_ranges(self):
+        ''' Test the time and price bounds are inclusive '''
+        quick_cheap = create_recipe(
+            user=self.user, time_in_minutes=30, price=Decimal('10.00')
+        )
+        create_recipe(
+            user=self.user, time_in_minutes=31, price=Decimal('5.00')
+        )
+        create_recipe(
+            user=self.user, time_in_minutes=20, price=Decimal('10.01')
+        )
+
+        res = self.client.get(
+            RECIPE_URL, {'max_time': 30, 'max_price': '10.00'}
+        )
+        invalid = self.client.get(RECIPE_URL, {'min_price': 'cheap'})
+
+        self.assertEqual(
+            [recipe['id'] for recipe in res.data['results']],
+            [quick_cheap.id],
+        )
+        self.assertEqual(invalid.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('min_price', invalid.data)
+
+    def test_ordering_by_price_pages_through_ties(self):
+        ''' Test keyset pages sorted on price neither skip nor repeat '''
+        recipes = [
+            create_recipe(user=self.user, price=Decimal(price))
+            for price in ('4.50', '2.00', '4.50', '2.00', '4.50')
+        ]
+
+        res = self.client.get(
+            RECIPE_URL, {'ordering': '-price', 'page_size': 2}
+        )
+        ids = [recipe['id'] for recipe in res.data['results']]
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            ids += [recipe['id'] for recipe in res.data['results']]
+        previous_ids = [recipe['id'] for recipe in res.data['results']]
+        while res.data['previous']:
+            res = self.client.get(res.data['previous'])
+            previous_ids[:0] = [recipe['id'] for recipe in res.data['results']]
+        invalid = self.client.get(RECIPE_URL, {'ordering': 'title'})
+
+        self.assertEqual(
+            ids, [recipes[i].id for i in (4, 2, 0, 3, 1)]
+        )
+        self.assertEqual(previous_ids, ids)
+        self.assertEqual(invalid.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_ordering_overrides_search_rank(self):
+        ''' Test an explicit ordering sorts search results '''
+        slow = create_recipe(
+            user=self.user, title='Curry curry', time_in_minutes=60
+        )
+        fast = create_recipe(
+            user=self.user, title='Curry', time_in_minutes=15
+        )
+
+        res = self.client.get(
+            RECIPE_URL, {'search': 'curry', 'ordering': 'time_in_minutes'}
+        )
+
+        self.assertEqual(
+            [recipe['id'] for recipe in res.data['results']],
+            [fast.id, slow.id],
+        )
+
+    def test_facets_count_filtered_recipes(self):
+        ''' Test the facets count the recipes matching the filters '''
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        quick = Tag.objects.create(user=self.user, name='Quick')
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+        for title, tags in (
+                ('Vegan chili', [vegan, quick]), ('Vegan stew', [vegan]),
+                ('Beef chili', [quick])):
+            recipe = create_recipe(user=self.user, title=title)
+            recipe.tags.add(*tags)
+            recipe.ingredients.add(salt)
+        other_user = create_user(
+            email='facets@gmail.com', password='recipes10205',
+            phone_number='0978230097', name='Other Cheff',
+        )
+        create_recipe(user=other_user, tags=[{'name': 'Vegan'}])
+
+        with self.assertNumQueries(1):
+            res = self.client.get(RECIPE_FACETS_URL)
+        filtered = self.client.get(
+            RECIPE_FACETS_URL, {'tags': str(vegan.id), 'search': 'chili'}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {
+            'tags': [
+                {'id': quick.id, 'name': 'Quick', 'count': 2},
+                {'id': vegan.id, 'name': 'Vegan', 'count': 2},
+            ],
+            'ingredients': [{'id': salt.id, 'name': 'Salt', 'count': 3}],
+        })
+        self.assertEqual(filtered.data, {
+            'tags': [
+                {'id': quick.id, 'name': 'Quick', 'count': 1},
+                {'id': vegan.id, 'name': 'Vegan', 'count': 1},
+            ],
+            'ingredients': [{'id': salt.id, 'name': 'Salt', 'count': 1}],
+        })
+
+    def test_facets_filtered_query_count(self):
+        ''' Test filtered facets are counted in one grouped query '''
+        recipe = create_recipe(user=self.user, tags=[{'name': 'Vegan'}])
+        tag = recipe.tags.get()
+
+        with self.assertNumQueries(1):
+            res = self.client.get(
+                RECIPE_FACETS_URL, {'tags': str(tag.id), 'match': 'all'}
+            )
+
+        self.assertEqual(res.data['tags'][0]['count'], 1)
+        self.assertEqual(res.data['ingredients'], [])
+
+    def test_list_query_count_is_constant(self):
+        ''' Test listing recipes does not issue a query per recipe '''
+        for i in range(5):
+            recipe = create_recipe(
+                user=self.user,
+                tags=[{'name': f'Tag {i}'}, {'name': f'Other Tag {i}'}],
+            )
+            recipe.ingredients.add(
+                Ingredient.objects.create(user=self.user, name=f'Salt {i}'),
+                Ingredient.objects.create(user=self.user, name=f'Oil {i}'),
+            )
+
+        # The conditional GET aggregate, the recipes, then one query per
+        # prefetched relation.
+        with self.assertNumQueries(4):
+            res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 5)
+        self.assertEqual(len(res.data['results'][0]['tags']), 2)
+        self.assertEqual(len(res.data['results'][0]['ingredients']), 2)
+
+    def test_sparse_fields_prune_columns_and_prefetches(self):
+        ''' Test ?fields= trims the output, the columns and prefetches '''
+        create_recipe(
+            user=self.user, tags=[{'name': 'Vegan'}],
+            description='A description long enough to skip',
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(
+                RECIPE_URL, {'fields': 'id,title,image', 'ordering': 'price'}
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            set(res.data['results'][0]), {'id', 'title', 'image'}
+        )
+        # The conditional GET aggregate and the recipes, no prefetches.
+        self.assertEqual(len(queries), 2)
+        recipes_sql = queries[1]['sql']
+        self.assertIn('"core_recipe"."price"', recipes_sql)
+        self.assertNotIn('"core_recipe"."description"', recipes_sql)
+        self.assertNotIn('core_recipe_tags', recipes_sql)
+
+    def test_sparse_fields_omit_and_retrieve(self):
+        ''' Test ?omit= drops fields and sparse fields apply to details '''
+        recipe = create_recipe(user=self.user, tags=[{'name': 'Vegan'}])
+
+        listed = self.client.get(
+            RECIPE_URL, {'omit': 'description,ingredients'}
+        )
+        detail = self.client.get(
+            detail_url(recipe.id), {'fields': 'title,tags'}
+        )
+
+        self.assertEqual(
+            set(listed.data['results'][0]),
+            set(RecipeSerializer.Meta.fields) - {'description', 'ingredients'},
+        )
+        self.assertEqual(
+            detail.data, {'title': recipe.title, 'tags': [
+                {'id': recipe.tags.get().id, 'name': 'Vegan'}
+            ]},
+        )
+
+    def test_sparse_fields_unknown_field(self):
+        ''' Test asking for a field the recipe does not have fails '''
+        res = self.client.get(RECIPE_URL, {'fields': 'id,user'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('fields', res.data)
+
+    def test_fast_list_matches_serializer_output(self):
+        ''' Test the row serializer renders the same bytes as the model one '''
+        for i, price in enumerate(('5.00', '12.50', '0.99')):
+            recipe = create_recipe(
+                user=self.user, title=f'Curry n\u00ba{i} "spicy"',
+                price=Decimal(price),
+                tags=[{'name': 'Vegan'}, {'name': f'Tag {i}'}],
+            )
+            salt, _ = Ingredient.objects.get_or_create(
+                user=self.user, name='Salt'
+            )
+            recipe.ingredients.add(salt)
+        recipe.image.name = 'uploads/recipe/abc.jpg'
+        recipe.save()
+        create_recipe(user=self.user, description='Plain curry')
+
+        for params in (
+                {}, {'search': 'curry'}, {'fields': 'id,tags,image_variants'},
+                {'ordering': 'price', 'page_size': 2}):
+            responses = []
+            for fast_list in (False, True):
+                get_response_cache().clear()
+                with patch.object(RecipeViewSet, 'fast_list', fast_list):
+                    responses.append(self.client.get(RECIPE_URL, params))
+            self.assertEqual(responses[0].status_code, status.HTTP_200_OK)
+            self.assertEqual(responses[1].content, responses[0].content)
+
+    def test_recipe_detail_query_count(self):
+        ''' Test the recipe detail prefetches tags and ingredients '''
+        recipe = create_recipe(
+            user=self.user,
+            tags=[{'name': 'Vegan'}, {'name': 'Dinner'}],
+        )
+
+        with self.assertNumQueries(4):
+            res = self.client.get(detail_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['tags']), 2)
+
+    @override_settings(RECIPE_EXPORT_CHUNK_SIZE=2)
+    def test_export_streams_ndjson(self):
+        ''' Test the export streams one recipe per line, chunk by chunk '''
+        for i in range(5):
+            create_recipe(
+                user=self.user, title=f'Recipe {i}',
+                tags=[{'name': 'Vegan'}],
+            )
+        create_recipe(user=create_user(
+            email='other@example.com', password='pass12345',
+            phone_number='0700000001',
+        ))
+
+        # One cursor over the recipes, then both relations per chunk.
+        with self.assertNumQueries(7):
+            res = self.client.get(RECIPE_EXPORT_URL)
+            lines = b''.join(res.streaming_content).splitlines()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        recipes = Recipe.objects.filter(user=self.user).order_by('-id')
+        serializer = RecipeSerializer(recipes, many=True)
+        self.assertEqual(
+            [json.loads(line) for line in lines],
+            json.loads(json.dumps(serializer.data)),
+        )
+
+    def test_bulk_create_recipes(self):
+        ''' Test creating many recipes with a constant number of queries '''
+        Tag.objects.create(user=self.user, name='Dinner')
+        payload = [
+            {
+                'title': f'Recipe {i}',
+                'time_in_minutes': 10 + i,
+                'price': '5.00',
+                'description': f'Bulk recipe {i}',
+                'link': f'https://example.com/{i}',
+                'tags': [{'name': 'Dinner'}, {'name': f'Tag {i % 3}'}],
+                'ingredients': [{'name': 'Salt'}, {'name': f'Item {i}'}],
+            }
+            for i in range(20)
+        ]
+
+        # Savepoint, insert the recipes, lookup, upsert and link each
+        # relation, release, then read the recipes and relations back.
+        with self.assertNumQueries(12):
+            res = self.client.post(RECIPE_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            [recipe['title'] for recipe in res.data],
+            [recipe['title'] for recipe in payload],
+        )
+        self.assertEqual(len(res.data[0]['tags']), 2)
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 20)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 4)
+        self.assertEqual(
+            Ingredient.objects.filter(user=self.user).count(), 21
+        )
+        recipe = Recipe.objects.get(id=res.data[5]['id'])
+        self.assertEqual(
+            set(recipe.ingredients.values_list('name', flat=True)),
+            {'Salt', 'Item 5'},
+        )
+
+    def test_bulk_create_reports_item_errors(self):
+        ''' Test invalid items are reported and nothing is saved '''
+        payload = [
+            {
+                'title': 'Valid', 'time_in_minutes': 5, 'price': '1.00',
+                'description': 'Valid recipe', 'link': 'https://example.com/r',
+            },
+            {'title': 'Invalid', 'price': '1.00'},
+        ]
+
+        res = self.client.post(RECIPE_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('time_in_minutes', res.data[1])
+        self.assertFalse(Recipe.objects.filter(user=self.user).exists())
+
+
+class ResponseCacheTests(TestCase):
+    ''' Test the per user list response cache '''
+    def setUp(self):
+        get_response_cache().clear()
+        get_stats_cache().clear()
+        self.client = APIClient()
+        self.user = create_user(
+            email='cachetest@gmail.com',
+            password='recipes10203',
+            phone_number='0978230099',
+            name='Cache Cheff'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_list_served_from_cache(self):
+        ''' Test repeating a list request only runs the ETag query '''
+        create_recipe(user=self.user, tags=[{'name': 'Vegan'}])
+        res = self.client.get(RECIPE_URL)
+
+        with self.assertNumQueries(1):
+            cached = self.client.get(RECIPE_URL)
+
+        self.assertEqual(cached.status_code, status.HTTP_200_OK)
+        self.assertEqual(cached.content, res.content)
+        self.assertEqual(cached['Content-Type'], res['Content-Type'])
+
+    def test_list_cache_keyed_on_query_params(self):
+        ''' Test different filters are cached separately '''
+        r1 = create_recipe(user=self.user, tags=[{'name': 'Vegan'}])
+        create_recipe(user=self.user)
+        tag = r1.tags.get()
+
+        self.client.get(RECIPE_URL)
+        res = self.client.get(RECIPE_URL, {'tags': str(tag.id)})
+
+        self.assertEqual(len(res.json()['results']), 1)
+
+    def test_write_invalidates_cached_list(self):
+        ''' Test changes to recipes and their links refresh the list '''
+        recipe = create_recipe(user=self.user)
+        self.client.get(RECIPE_URL)
+
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Lunch'))
+        res = self.client.get(RECIPE_URL)
+        self.assertEqual(res.json()['results'][0]['tags'][0]['name'], 'Lunch')
+
+        Recipe.objects.create(
+            user=self.user, title='Second', time_in_minutes=5,
+            price=Decimal('1.00'), description='', link='',
+        )
+        res = self.client.get(RECIPE_URL)
+        self.assertEqual(len(res.json()['results']), 2)
+
+    def test_facets_cached_until_data_changes(self):
+        ''' Test facets are cached per data version '''
+        recipe = create_recipe(user=self.user, tags=[{'name': 'Vegan'}])
+        self.client.get(RECIPE_FACETS_URL)
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(RECIPE_FACETS_URL)
+        recipe.tags.clear()
+        res = self.client.get(RECIPE_FACETS_URL)
+
+        self.assertEqual(cached.json()['tags'][0]['count'], 1)
+        self.assertEqual(res.json()['tags'], [])
+
+    def test_cache_not_shared_between_users(self):
+        ''' Test one user's cached list is never served to another '''
+        create_recipe(user=self.user)
+        self.client.get(RECIPE_URL)
+        other_user = create_user(
+            email='cachetest2@gmail.com',
+            password='recipes10204',
+            phone_number='0978230098',
+            name='Other Cheff'
+        )
+        self.client.force_authenticate(other_user)
+
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.json()['results'], [])
+
+    def test_cache_stats(self):
+        ''' Test admins can read the hit ratio and bytes served '''
+        create_recipe(user=self.user)
+        self.client.get(RECIPE_URL)
+        cached = self.client.get(RECIPE_URL)
+        self.user.is_staff = True
+        self.user.save()
+
+        res = self.client.get(CACHE_STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['hits'], 1)
+        self.assertEqual(res.data['misses'], 1)
+        self.assertEqual(res.data['hit_ratio'], 0.5)
+        self.assertEqual(res.data['bytes_served'], len(cached.content))
+
+    def test_cache_stats_survive_clearing_responses(self):
+        ''' Test the counters are not stored with the cached responses '''
+        create_recipe(user=self.user)
+        self.client.get(RECIPE_URL)
+        get_response_cache().clear()
+        self.user.is_staff = True
+        self.user.save()
+
+        res = self.client.get(CACHE_STATS_URL)
+
+        self.assertEqual(res.data['misses'], 1)
+
+    def test_cache_stats_requires_admin(self):
+        ''' Test regular users cannot read the cache stats '''
+        res = self.client.get(CACHE_STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_db_stats(self):
+        ''' Test admins can read how database connections are reused '''
+        self.user.is_staff = True
+        self.user.save()
+        get_stats_cache().delete(CONNECTIONS_KEY)
+        record_connection(connection)
+
+        with patch.dict(connection.settings_dict, {
+                'CONN_MAX_AGE': 60, 'DISABLE_SERVER_SIDE_CURSORS': True}):
+            res = self.client.get(DB_STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['mode'], 'persistent')
+        self.assertEqual(res.data['conn_max_age'], 60)
+        self.assertFalse(res.data['server_side_cursors'])
+        self.assertEqual(res.data['connections_opened'], 1)
+        self.assertIsNone(res.data['pool'])
+
+    def test_db_stats_requires_admin(self):
+        ''' Test regular users cannot read the database stats '''
+        res = self.client.get(DB_STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ConditionalGetTests(TestCase):
+    ''' Test ETag and Last-Modified handling on the recipe endpoints '''
+    def setUp(self):
+        get_response_cache().clear()
+        self.client = APIClient()
+        self.user = create_user(
+            email='etagtest@gmail.com',
+            password='recipes10205',
+            phone_number='0978230097',
+            name='Etag Cheff'
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(user=self.user, tags=[{'name': 'Soup'}])
+
+    def test_detail_not_modified(self):
+        ''' Test a matching If-None-Match returns 304 in one query '''
+        res = self.client.get(detail_url(self.recipe.id))
+        etag = res['ETag']
+        self.assertFalse(etag.startswith('W/'))
+        self.assertIn('Last-Modified', res)
+
+        with self.assertNumQueries(1):
+            res = self.client.get(
+                detail_url(self.recipe.id), HTTP_IF_NONE_MATCH=etag
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res.content, b'')
+        self.assertEqual(res['ETag'], etag)
+
+    def test_detail_modified_after_update(self):
+        ''' Test updating the recipe changes its ETag '''
+        etag = self.client.get(detail_url(self.recipe.id))['ETag']
+        self.client.patch(detail_url(self.recipe.id), {'title': 'Broth'})
+
+        res = self.client.get(
+            detail_url(self.recipe.id), HTTP_IF_NONE_MATCH=etag
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+
+    def test_missing_detail_ignores_if_none_match_star(self):
+        ''' Test If-None-Match: * does not hide a missing recipe '''
+        res = self.client.get(detail_url(987654), HTTP_IF_NONE_MATCH='*')
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_weak_etag_changes_on_tag_rename(self):
+        ''' Test renaming a nested tag invalidates the list ETag '''
+        res = self.client.get(RECIPE_URL)
+        etag = res['ETag']
+        self.assertTrue(etag.startswith('W/'))
+
+        res = self.client.get(RECIPE_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        tag = self.recipe.tags.get()
+        tag.name = 'Stew'
+        tag.save()
+        res = self.client.get(RECIPE_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_list_if_modified_since(self):
+        ''' Test If-Modified-Since returns 304 when nothing changed '''
+        last_modified = self.client.get(RECIPE_URL)['Last-Modified']
+
+        res = self.client.get(
+            RECIPE_URL, HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
 
 
 class ImageUploadTests(TestCase):
@@ -290,6 +1095,13 @@ class ImageUploadTests(TestCase):
         self.recipe = create_recipe(user=self.user)
 
     def tearDown(self):
+        self.recipe.refresh_from_db()
+        if self.recipe.image:
+            variants = os.path.join(
+                os.path.dirname(self.recipe.image.path), 'variants',
+                os.path.splitext(os.path.basename(self.recipe.image.name))[0]
+            )
+            shutil.rmtree(variants, ignore_errors=True)
         self.recipe.image.delete()
 
     def test_upload_image(self):
@@ -306,3 +1118,290 @@ class ImageUploadTests(TestCase):
             self.assertEqual(res.status_code, status.HTTP_200_OK)
             self.assertIn('image', res.data)
             self.assertTrue(os.path.exists(self.recipe.image.path))
+
+    def test_upload_image_generates_variants(self):
+        ''' Test the worker writes each variant width in every format '''
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', (800, 400)).save(image_file, format='JPEG')
+            image_file.seek(0)
+            self.client.post(url, {'image': image_file}, format='multipart')
+        self.recipe.refresh_from_db()
+        _, first_variant = variant_names(self.recipe.image.name)[0]
+        self.assertFalse(self.recipe.image.storage.exists(first_variant))
+
+        out = StringIO()
+        call_command('process_image_uploads', '--once', stdout=out)
+
+        self.assertIn(': done', out.getvalue())
+        res = self.client.get(detail_url(self.recipe.id))
+        variants = res.data['image_variants']
+        self.assertEqual(list(variants), ['160', '320', '640', '1280'])
+        for width, name in variant_names(self.recipe.image.name):
+            path = self.recipe.image.storage.path(name)
+            self.assertTrue(variants[str(width)].endswith(name))
+            with Image.open(path) as image:
+                self.assertEqual(image.size[0], min(width, 800))
+            if features.check('webp'):
+                self.assertTrue(os.path.exists(f'{path}.webp'))
+
+    def test_upload_image_variants_follow_exif_orientation(self):
+        ''' Test variants of a rotated photo are stored upright '''
+        url = image_upload_url(self.recipe.id)
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: rotate 90 degrees clockwise.
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', (400, 200)).save(
+                image_file, format='JPEG', exif=exif
+            )
+            image_file.seek(0)
+            self.client.post(url, {'image': image_file}, format='multipart')
+
+        call_command('process_image_uploads', '--once', stdout=StringIO())
+
+        self.recipe.refresh_from_db()
+        _, name = variant_names(self.recipe.image.name)[0]
+        with Image.open(self.recipe.image.storage.path(name)) as image:
+            self.assertEqual(image.size, (80, 160))
+
+    def test_upload_image_async(self):
+        ''' Test queueing an image and processing it in the background '''
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.png') as image_file:
+            Image.new('RGB', (3000, 1500)).save(image_file, format='PNG')
+            image_file.seek(0)
+            res = self.client.post(
+                f'{url}?async=1', {'image': image_file}, format='multipart'
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(res.data['status'], RecipeImageUpload.PENDING)
+        self.assertEqual(res['Location'], res.data['status_url'])
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+        call_command('process_image_uploads', '--once', stdout=StringIO())
+
+        res = self.client.get(image_upload_status_url(res.data['id']))
+        self.assertEqual(res.data['status'], RecipeImageUpload.DONE)
+        self.recipe.refresh_from_db()
+        self.assertTrue(os.path.exists(self.recipe.image.path))
+        with Image.open(self.recipe.image.path) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(max(image.size), 2048)
+        for _, name in variant_names(self.recipe.image.name):
+            self.assertTrue(self.recipe.image.storage.exists(name))
+
+    def test_upload_image_async_invalid_image(self):
+        ''' Test a queued upload that is not an image is marked failed '''
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            image_file.write(b'not an image')
+            image_file.seek(0)
+            res = self.client.post(
+                f'{url}?async=1', {'image': image_file}, format='multipart'
+            )
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+
+        call_command('process_image_uploads', '--once', stdout=StringIO())
+
+        upload = RecipeImageUpload.objects.get(id=res.data['id'])
+        self.assertEqual(upload.status, RecipeImageUpload.FAILED)
+        self.assertTrue(upload.error)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+        upload.upload.delete()
+
+    def test_upload_image_async_storage_error(self):
+        ''' Test an error after decoding marks the upload failed '''
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', (10, 10)).save(image_file, format='JPEG')
+            image_file.seek(0)
+            res = self.client.post(
+                f'{url}?async=1', {'image': image_file}, format='multipart'
+            )
+
+        out = StringIO()
+        with patch('core.images.generate_variants',
+                   side_effect=OSError('No space left on device')):
+            call_command('process_image_uploads', '--once', stdout=out)
+
+        self.assertIn(': failed', out.getvalue())
+        res = self.client.get(image_upload_status_url(res.data['id']))
+        self.assertEqual(res.data['status'], RecipeImageUpload.FAILED)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+        RecipeImageUpload.objects.get(id=res.data['id']).upload.delete()
+
+    def _upload(self, recipe, color):
+        ''' Upload a solid colour image to a recipe '''
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', (10, 10), color).save(image_file, format='JPEG')
+            image_file.seek(0)
+            res = self.client.post(
+                image_upload_url(recipe.id),
+                {'image': image_file}, format='multipart'
+            )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        recipe.refresh_from_db()
+        return recipe.image
+
+    def test_identical_images_share_one_file(self):
+        ''' Test uploading the same bytes twice stores them once '''
+        other = create_recipe(user=self.user)
+        first = self._upload(self.recipe, 'red')
+        second = self._upload(other, 'red')
+
+        self.assertEqual(first.name, second.name)
+        directory = os.path.dirname(first.path)
+        stem = os.path.splitext(os.path.basename(first.name))[0]
+        self.assertEqual(
+            [name for name in os.listdir(directory) if stem in name],
+            [os.path.basename(first.name)],
+        )
+
+    @override_settings(RECIPE_IMAGE_GRACE_SECONDS=0)
+    def test_replaced_image_released_when_unreferenced(self):
+        ''' Test a replaced image is deleted once no recipe uses it '''
+        other = create_recipe(user=self.user)
+        shared = self._upload(self.recipe, 'blue')
+        self._upload(other, 'blue')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self._upload(self.recipe, 'green')
+        self.assertTrue(os.path.exists(shared.path))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        self.assertFalse(os.path.exists(shared.path))
+        _, variant = variant_names(shared.name)[0]
+        self.assertFalse(shared.storage.exists(variant))
+
+
+@override_settings(ASYNC_READ_VIEWS=True)
+class AsyncReadViewTests(TestCase):
+    ''' Test the coroutine read views match the sync ones '''
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            email='asyncreads@gmail.com',
+            password='recipes10202',
+            phone_number='0978230099',
+            name='Cheff Async'
+        )
+        self.client.force_authenticate(self.user)
+        self.factory = AsyncRequestFactory()
+
+    def _get(self, view, path, params=None, headers=None, **kwargs):
+        ''' Return the rendered response of a coroutine view '''
+        request = self.factory.get(path, params, headers=headers)
+        force_authenticate(request, self.user)
+        response = async_to_sync(view)(request, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+
+    def test_read_actions_are_coroutines(self):
+        ''' Test only views with a read action become coroutines '''
+        self.assertTrue(iscoroutinefunction(
+            RecipeViewSet.as_view({'get': 'list', 'post': 'create'})
+        ))
+        self.assertFalse(iscoroutinefunction(
+            RecipeViewSet.as_view({'post': 'bulk'})
+        ))
+        with override_settings(ASYNC_READ_VIEWS=False):
+            self.assertFalse(iscoroutinefunction(
+                RecipeViewSet.as_view({'get': 'list'})
+            ))
+
+    def test_async_reads_match_sync(self):
+        ''' Test the async list and detail render the same bytes '''
+        for i in range(3):
+            recipe = create_recipe(
+                user=self.user, title=f'Curry {i}',
+                tags=[{'name': 'Vegan'}, {'name': f'Tag {i}'}],
+            )
+            salt, _ = Ingredient.objects.get_or_create(
+                user=self.user, name='Salt'
+            )
+            recipe.ingredients.add(salt)
+        recipe_list = RecipeViewSet.as_view({'get': 'list'})
+        recipe_detail = RecipeViewSet.as_view({'get': 'retrieve'})
+        cases = [
+            (recipe_list, RECIPE_URL, {}, {}),
+            (recipe_list, RECIPE_URL, {'search': 'curry', 'page_size': 2}, {}),
+            (recipe_list, RECIPE_URL, {'fields': 'id,tags'}, {}),
+            (recipe_detail, detail_url(recipe.id), {}, {'pk': recipe.id}),
+            (TagViewSet.as_view({'get': 'list'}), TAGS_URL, {}, {}),
+            (IngredientViewSet.as_view({'get': 'list'}), INGREDIENTS_URL,
+             {'assigned_only': 1}, {}),
+        ]
+
+        for view, path, params, kwargs in cases:
+            get_response_cache().clear()
+            res = self._get(view, path, params, **kwargs)
+            get_response_cache().clear()
+            expected = self.client.get(path, params)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(res.content, expected.content)
+
+    def test_async_detail_not_modified_and_not_found(self):
+        ''' Test the async detail honours validators and hides others '''
+        recipe = create_recipe(user=self.user)
+        other = create_recipe(user=create_user(
+            email='other@gmail.com', password='recipes10202',
+            phone_number='0978230098', name='Other'
+        ))
+        view = RecipeViewSet.as_view({'get': 'retrieve'})
+        etag = self._get(
+            view, detail_url(recipe.id), pk=recipe.id
+        )['ETag']
+
+        res = self._get(
+            view, detail_url(recipe.id), headers={'if-none-match': etag},
+            pk=recipe.id,
+        )
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        for pk in (other.id, 'abc'):
+            res = self._get(view, detail_url(pk), pk=pk)
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(RECIPE_EXPORT_CHUNK_SIZE=2)
+    def test_async_export_streams_same_lines(self):
+        ''' Test the export streams from the async ORM under ASGI '''
+        for i in range(5):
+            create_recipe(
+                user=self.user, title=f'Recipe {i}',
+                tags=[{'name': 'Vegan'}, {'name': f'Tag {i}'}],
+            )
+        with override_settings(ASYNC_READ_VIEWS=False):
+            expected = b''.join(
+                self.client.get(RECIPE_EXPORT_URL).streaming_content
+            )
+
+        res = self.client.get(RECIPE_EXPORT_URL)
+
+        async def read(content):
+            return b''.join([part async for part in content])
+
+        self.assertTrue(res.is_async)
+        self.assertEqual(
+            async_to_sync(read)(res.streaming_content), expected
+        )
+        self.assertEqual(len(expected.splitlines()), 5)
+
+    def test_async_view_runs_writes_in_a_thread(self):
+        ''' Test other methods on a coroutine view still run sync '''
+        view = RecipeViewSet.as_view({'get': 'list', 'post': 'create'})
+        request = self.factory.post(RECIPE_URL, {
+            'title': 'Async curry', 'time_in_minutes': 10, 'price': '5.00',
+            'link': 'https://example.com/curry',
+            'description': 'Served by a worker thread',
+        }, content_type='application/json')
+        force_authenticate(request, self.user)
+
+        res = async_to_sync(view)(request)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Recipe.objects.filter(title='Async curry').exists())
@@ -87,6 +87,17 @@ class PrivateTagsAPITests(TestCase):
         tag.refresh_from_db()
         self.assertEqual(tag.name, payload['name'])
 
+    def test_update_tag_to_existing_name_rejected(self):
+        ''' Test renaming a tag onto another tag's name fails '''
+        Tag.objects.create(user=self.user, name='Dinner')
+        tag = Tag.objects.create(user=self.user, name='Supper')
+
+        res = self.client.patch(detail_url(tag.id), {'name': 'Dinner'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        tag.refresh_from_db()
+        self.assertEqual(tag.name, 'Supper')
+
     def test_delete_tags(self):
         ''' Test deleting a tag '''
         tag = Tag.objects.create(user=self.user, name='After Breakfast')
@@ -108,6 +119,7 @@ class PrivateTagsAPITests(TestCase):
             user=self.user,
         )
         recipe.tags.add(tag1)
+        tag1.refresh_from_db()
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
 
         s1 = TagSerializer(tag1)
@@ -136,3 +148,69 @@ class PrivateTagsAPITests(TestCase):
 
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
         self.assertEqual(len(res.data), 1)
+
+    def test_recipe_count_follows_links(self):
+        ''' Test the recipe count follows every way links change '''
+        recipe_url = reverse('recipe:recipe-list')
+        payload = {
+            'title': 'Pancakes', 'time_in_minutes': 10, 'price': '2.00',
+            'description': 'Fluffy', 'link': 'https://pancakes.com',
+            'tags': [{'name': 'Breakfast'}, {'name': 'Sweet'}],
+        }
+        res = self.client.post(recipe_url, payload, format='json')
+        recipe_id = res.data['id']
+        self.client.post(
+            reverse('recipe:recipe-bulk'), [payload, payload], format='json'
+        )
+        breakfast = Tag.objects.get(user=self.user, name='Breakfast')
+        sweet = Tag.objects.get(user=self.user, name='Sweet')
+        self.assertEqual((breakfast.recipe_count, sweet.recipe_count), (3, 3))
+
+        self.client.patch(
+            reverse('recipe:recipe-detail', args=[recipe_id]),
+            {'tags': [{'name': 'Breakfast'}]}, format='json',
+        )
+        sweet.refresh_from_db()
+        self.assertEqual(sweet.recipe_count, 2)
+
+        Recipe.objects.filter(user=self.user).delete()
+        breakfast.refresh_from_db()
+        sweet.refresh_from_db()
+        self.assertEqual((breakfast.recipe_count, sweet.recipe_count), (0, 0))
+
+    def test_rename_keeps_recipe_count(self):
+        ''' Test saving a stale tag does not overwrite its count '''
+        tag = Tag.objects.create(user=self.user, name='Breakfast')
+        recipe = Recipe.objects.create(
+            title='Toast', time_in_minutes=5, price='1.00', user=self.user,
+        )
+        recipe.tags.add(tag)
+
+        res = self.client.patch(detail_url(tag.id), {'name': 'Brunch'})
+        tag.save()
+
+        self.assertEqual(res.data['recipe_count'], 1)
+        tag.refresh_from_db()
+        self.assertEqual(tag.recipe_count, 1)
+
+    def test_tags_ordered_by_recipe_count(self):
+        ''' Test listing tags by usage, most used first '''
+        tags = [
+            Tag.objects.create(user=self.user, name=name)
+            for name in ('Lunch', 'Dinner', 'Snack')
+        ]
+        for uses, tag in zip((1, 2, 0), tags):
+            for _ in range(uses):
+                Recipe.objects.create(
+                    title='Meal', time_in_minutes=5, price='1.00',
+                    user=self.user,
+                ).tags.add(tag)
+
+        res = self.client.get(TAGS_URL, {'ordering': '-recipe_count'})
+        invalid = self.client.get(TAGS_URL, {'ordering': 'user'})
+
+        self.assertEqual(
+            [(tag['name'], tag['recipe_count']) for tag in res.data],
+            [('Dinner', 2), ('Lunch', 1), ('Snack', 0)],
+        )
+        self.assertEqual(invalid.status_code, status.HTTP_400_BAD_REQUEST)
@@ -10,8 +10,21 @@ router = DefaultRouter()
 router.register('recipes', views.RecipeViewSet)
 router.register('tags', views.TagViewSet)
 router.register('ingredients', views.IngredientViewSet)
+router.register(
+    'image-uploads', views.RecipeImageUploadViewSet, basename='image-upload'
+)
 
 app_name = 'recipe'
 urlpatterns = [
+    path(
+        'cache-stats/',
+        views.ResponseCacheStatsView.as_view(),
+        name='cache-stats'
+    ),
+    path(
+        'db-stats/',
+        views.DatabaseStatsView.as_view(),
+        name='db-stats'
+    ),
     path('', include(router.urls), name='recipe-list'),
 ]
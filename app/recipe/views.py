@@ -3,14 +3,34 @@ from drf_spectacular.utils import (
     extend_schema_view, extend_schema,
     OpenApiParameter, OpenApiTypes
 )
+from django.conf import settings
+from django.contrib.postgres.search import (
+    SearchHeadline, SearchQuery, SearchRank
+)
+from django.db.models import F, FloatField, Prefetch, TextField, Value
+from django.db.models.functions import Cast, Concat
+from django.http import StreamingHttpResponse
 from rest_framework import viewsets, mixins, status
-from rest_framework.authentication import TokenAuthentication
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import DecimalField, IntegerField
 from rest_framework.response import Response
 
-from core.models import Recipe, Tag, Ingredient
+from core.authentication import CachedTokenAuthentication
+from core.cache import get_stats
+from core.db import get_stats as get_database_stats
+from core.images import queue_variants, release_image_on_commit
+from core.models import (
+    Recipe, Tag, Ingredient, RecipeImageUpload, SEARCH_CONFIG
+)
 from . import serializers
+from .mixins import (
+    AsyncReadMixin, CachedListMixin, ConditionalGetMixin, SparseFieldsMixin,
+)
+from .pagination import RecipeCursorPagination
+from .renderers import NDJSONRenderer
 
 
 @extend_schema_view(
@@ -21,47 +41,161 @@ from . import serializers
                 OpenApiTypes.INT, enum=[0, 1],
                 description='Filter by items assigned to recipes',
             ),
+            OpenApiParameter(
+                'ordering',
+                OpenApiTypes.STR,
+                enum=['name', '-name', 'recipe_count', '-recipe_count'],
+                description='Sort by name (default -name) or recipe count',
+            ),
         ]
     )
 )
 class BaseRecipeAttrViewSet(
+    CachedListMixin,
+    AsyncReadMixin,
     mixins.DestroyModelMixin,
     mixins.UpdateModelMixin,
     mixins.ListModelMixin,
     viewsets.GenericViewSet):
     ''' The Base view for the viewsets '''
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
+    # Sort orders by query parameter, each served by a (user, ...) index.
+    orderings = {
+        'name': ['name'],
+        '-name': ['-name'],
+        'recipe_count': ['recipe_count', 'name'],
+        '-recipe_count': ['-recipe_count', '-name'],
+    }
+
     def get_queryset(self):
         ''' Get the tags for the authenticated user '''
         assigned_only = bool(
             int(self.request.query_params.get('assigned_only', 0))
         )
+        ordering = self.request.query_params.get('ordering', '-name')
+        if ordering not in self.orderings:
+            raise ValidationError(
+                {'ordering': f'Expected one of {", ".join(self.orderings)}.'}
+            )
         queryset = self.queryset
         if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
+            queryset = queryset.filter(recipe_count__gt=0)
         return queryset.filter(
-            user=self.request.user).order_by('-name').distinct()
+            user=self.request.user).order_by(*self.orderings[ordering])
+
+
+# The recipe filters shared by the list, export and facets actions.
+RECIPE_FILTER_PARAMETERS = [
+    OpenApiParameter(
+        'tags',
+        OpenApiTypes.STR,
+        description='Comma separated list of IDs to filter',
+    ),
+    OpenApiParameter(
+        'ingredients',
+        OpenApiTypes.STR,
+        description='Comma separated list of IDs to filter',
+    ),
+    OpenApiParameter(
+        'match',
+        OpenApiTypes.STR, enum=['any', 'all'],
+        description=(
+            'Return recipes linked to any (default) or to all of '
+            'the given tags and ingredients'
+        ),
+    ),
+    OpenApiParameter(
+        'min_time', OpenApiTypes.INT,
+        description='Minimum preparation time in minutes',
+    ),
+    OpenApiParameter(
+        'max_time', OpenApiTypes.INT,
+        description='Maximum preparation time in minutes',
+    ),
+    OpenApiParameter(
+        'min_price', OpenApiTypes.DECIMAL, description='Minimum price',
+    ),
+    OpenApiParameter(
+        'max_price', OpenApiTypes.DECIMAL, description='Maximum price',
+    ),
+]
+ORDERING_PARAMETER = OpenApiParameter(
+    'ordering',
+    OpenApiTypes.STR,
+    enum=[
+        '-id', 'id', 'time_in_minutes', '-time_in_minutes', 'price', '-price'
+    ],
+    description=(
+        'Sort by creation (default -id, newest first), preparation time '
+        'or price, a search is ordered by rank unless this is given'
+    ),
+)
+# Trim the recipe representation on the read actions.
+SPARSE_FIELDS_PARAMETERS = [
+    OpenApiParameter(
+        'fields',
+        OpenApiTypes.STR,
+        description='Comma separated list of the only fields to return',
+    ),
+    OpenApiParameter(
+        'omit',
+        OpenApiTypes.STR,
+        description='Comma separated list of fields to leave out',
+    ),
+]
+SEARCH_PARAMETER = OpenApiParameter(
+    'search',
+    OpenApiTypes.STR,
+    description=(
+        'Full text search over the title and description, '
+        'results are ordered by rank and highlighted'
+    ),
+)
 
 
 @extend_schema_view(
     list=extend_schema(
+        parameters=[
+            *RECIPE_FILTER_PARAMETERS, SEARCH_PARAMETER, ORDERING_PARAMETER,
+            *SPARSE_FIELDS_PARAMETERS,
+        ],
+        responses=serializers.RecipeSearchSerializer(many=True),
+    ),
+    retrieve=extend_schema(parameters=SPARSE_FIELDS_PARAMETERS),
+    export=extend_schema(
+        parameters=[
+            *RECIPE_FILTER_PARAMETERS, ORDERING_PARAMETER,
+            *SPARSE_FIELDS_PARAMETERS,
+        ],
+        responses=serializers.RecipeSerializer,
+    ),
+    facets=extend_schema(
+        parameters=[*RECIPE_FILTER_PARAMETERS, SEARCH_PARAMETER],
+        responses=serializers.RecipeFacetsSerializer,
+    ),
+    bulk=extend_schema(
+        request=serializers.RecipeSerializer(many=True),
+        responses={201: serializers.RecipeSerializer(many=True)},
+    ),
+    upload_image=extend_schema(
         parameters=[
             OpenApiParameter(
-                'tags',
-                OpenApiTypes.STR,
-                description='Comma separated list of IDs to filter',
-            ),
-            OpenApiParameter(
-                'ingredients',
-                OpenApiTypes.STR,
-                description='Comma separated list of IDs to filter',
+                'async',
+                OpenApiTypes.INT, enum=[0, 1],
+                description=(
+                    'Queue the image for background processing and '
+                    'return 202 with a status URL'
+                ),
             ),
         ]
-    )
+    ),
 )
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(
+    ConditionalGetMixin, CachedListMixin, SparseFieldsMixin, AsyncReadMixin,
+    viewsets.ModelViewSet
+):
     """ViewSet for managing recipes.
 
     This view set provides CRUD operations for recipes, ensuring that
@@ -70,50 +204,337 @@ class RecipeViewSet(viewsets.ModelViewSet):
     """
 
     serializer_class = serializers.RecipeDetailSerializer
-    queryset = Recipe.objects.all()
-    authentication_classes = [TokenAuthentication]
+    # The stored search vector is only read by the database.
+    queryset = Recipe.objects.defer('search_vector')
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = RecipeCursorPagination
+
+    # Serve JSON lists from .values() rows, see RecipeRowSerializer.
+    fast_list = True
+
+    # Actions whose serializer renders the nested tags and ingredients.
+    prefetch_actions = [
+        'list', 'retrieve', 'update', 'partial_update', 'bulk', 'export'
+    ]
+
+    # Sort orders by query parameter, each ends on the id so that keyset
+    # pages over equal times or prices neither skip nor repeat rows.
+    orderings = {
+        '-id': ['-id'],
+        'id': ['id'],
+        'time_in_minutes': ['time_in_minutes', 'id'],
+        '-time_in_minutes': ['-time_in_minutes', '-id'],
+        'price': ['price', 'id'],
+        '-price': ['-price', '-id'],
+    }
+    # Model columns read by the serializer fields not named after one.
+    field_columns = {
+        'image_variants': ['image'],
+        'tags': [],
+        'ingredients': [],
+        'rank': [],
+        'highlight': [],
+    }
+    # Range filters by query parameter, each served by a (user, ...) index.
+    range_filters = {
+        'min_time': ('time_in_minutes__gte', IntegerField(min_value=0)),
+        'max_time': ('time_in_minutes__lte', IntegerField(min_value=0)),
+        'min_price': (
+            'price__gte', DecimalField(max_digits=10, decimal_places=2)
+        ),
+        'max_price': (
+            'price__lte', DecimalField(max_digits=10, decimal_places=2)
+        ),
+    }
 
     def _params_to_ints(self, qs):
         ''' Convert a list of strings to integers'''
         return [int(str_id) for str_id in qs.split(',')]
 
+    def _get_prefetches(self):
+        ''' Return the prefetches needed by the current action '''
+        if self.action not in self.prefetch_actions or self._use_fast_list():
+            return []
+        fields = self.get_sparse_fields()
+        return [
+            Prefetch(
+                name,
+                queryset=model.objects.only('id', 'name').order_by(
+                    'name', 'id'
+                ),
+            )
+            for name, model in (('tags', Tag), ('ingredients', Ingredient))
+            if fields is None or name in fields
+        ]
+
+    def _use_fast_list(self):
+        ''' Whether the list is rendered from rows by RecipeRowSerializer '''
+        renderer = getattr(self.request, 'accepted_renderer', None)
+        # The browsable API builds its forms from the real serializer.
+        return (
+            self.fast_list and self.action == 'list'
+            and renderer is not None and renderer.format != 'api'
+        )
+
+    def _get_columns(self, fields, ordering):
+        ''' Return the columns to load for the fields and the ordering '''
+        columns = {'id'}
+        for name in fields:
+            columns.update(self.field_columns.get(name, [name]))
+        # The cursor position is read from the ordering columns.
+        columns.update(order.lstrip('-') for order in ordering)
+        return sorted(columns)
+
+    def _search(self, queryset, search):
+        ''' Filter by a web search query, annotating rank and snippet '''
+        query = SearchQuery(
+            search, config=SEARCH_CONFIG, search_type='websearch'
+        )
+        return queryset.search(self.request.user, query).annotate(
+            # Double precision values survive the cursor round trip.
+            search_rank=Cast(
+                SearchRank(F('search_vector'), query), FloatField()
+            ),
+            search_highlight=SearchHeadline(
+                Concat(
+                    'title', Value('\n'), 'description',
+                    output_field=TextField(),
+                ),
+                query,
+                config=SEARCH_CONFIG, start_sel='<mark>', stop_sel='</mark>',
+                max_fragments=3,
+            ),
+        )
+
+    def _get_range_filters(self):
+        ''' Return the lookups of the given range parameters '''
+        lookups = {}
+        for param, (lookup, field) in self.range_filters.items():
+            value = self.request.query_params.get(param)
+            if value is None:
+                continue
+            try:
+                lookups[lookup] = field.run_validation(value)
+            except ValidationError as error:
+                raise ValidationError({param: error.detail})
+        return lookups
+
+    def _get_ordering(self):
+        ''' Return the requested sort order, None for the default '''
+        ordering = self.request.query_params.get('ordering')
+        if ordering is not None and ordering not in self.orderings:
+            raise ValidationError(
+                {'ordering': f'Expected one of {", ".join(self.orderings)}.'}
+            )
+        return ordering
+
     def get_queryset(self):
         ''' Retrieve recipes for the authenticated user '''
         tags = self.request.query_params.get('tags')
         ingredients = self.request.query_params.get('ingredients')
+        search = self.request.query_params.get('search')
+        match = self.request.query_params.get('match', 'any')
+        if match not in ('any', 'all'):
+            raise ValidationError({'match': 'Expected "any" or "all".'})
         queryset = self.queryset
         if tags:
             tag_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
+            queryset = queryset.linked_to('tags', tag_ids, match == 'all')
         if ingredients:
             ingredient_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
-        return queryset.filter(
-            user=self.request.user).order_by('-id').distinct()
+            queryset = queryset.linked_to(
+                'ingredients', ingredient_ids, match == 'all'
+            )
+        ordering = self._get_ordering()
+        order_by = self.orderings[ordering or '-id']
+        queryset = queryset.filter(
+            user=self.request.user, **self._get_range_filters()
+        ).order_by(*order_by).prefetch_related(*self._get_prefetches())
+        fields = self.get_sparse_fields()
+        if self._use_fast_list():
+            queryset = queryset.values(*self._get_columns(
+                fields or self.get_serializer_class().Meta.fields, order_by
+            ))
+        elif fields is not None:
+            queryset = queryset.only(*self._get_columns(fields, order_by))
+        if search and self.action in ('list', 'facets'):
+            queryset = self._search(queryset, search)
+            if ordering is None:
+                queryset = queryset.order_by('-search_rank', '-id')
+        return queryset
 
     def get_serializer_class(self):
         ''' Return the serializer to be used based on the action'''
-        if self.action == 'list':
+        if self.action == 'list' and self.request.query_params.get('search'):
+            return serializers.RecipeSearchSerializer
+        elif self.action in ('list', 'bulk', 'export'):
             return serializers.RecipeSerializer
         elif self.action == 'upload_image':
             return serializers.RecipeImageSerializer
+        elif self.action == 'facets':
+            return serializers.RecipeFacetsSerializer
         return self.serializer_class
 
+    def get_serializer(self, *args, **kwargs):
+        ''' Render the rows of a fast list without the model serializer '''
+        if args and self._use_fast_list():
+            return serializers.RecipeRowSerializer(
+                args[0], self.get_serializer_class(),
+                self.get_serializer_context(),
+            )
+        return super().get_serializer(*args, **kwargs)
+
     def perform_create(self, serializer):
         ''' Create a new recipe'''
         serializer.save(user=self.request.user)
 
+    @action(methods=['GET'], detail=False, renderer_classes=[NDJSONRenderer])
+    def export(self, request):
+        ''' Stream every recipe of the user as newline delimited JSON
+
+        Rows are read through a server side cursor and the tags and
+        ingredients are prefetched per chunk, memory use does not grow
+        with the number of recipes.
+        '''
+        queryset = self.filter_queryset(self.get_queryset())
+        # ASGI collects a sync iterator in a thread before sending it.
+        export_lines = (
+            self._aexport_lines if settings.ASYNC_READ_VIEWS
+            else self._export_lines
+        )
+        response = StreamingHttpResponse(
+            export_lines(request.accepted_renderer, queryset),
+            content_type=NDJSONRenderer.media_type,
+        )
+        response['Content-Disposition'] = (
+            'attachment; filename="recipes.ndjson"'
+        )
+        # Pass lines through nginx as they are produced.
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    def _export_lines(self, renderer, queryset):
+        ''' Yield the rendered line of each recipe '''
+        serializer = self.get_serializer()
+        for recipe in queryset.iterator(
+                chunk_size=settings.RECIPE_EXPORT_CHUNK_SIZE):
+            yield renderer.render_line(serializer.to_representation(recipe))
+
+    async def _aexport_lines(self, renderer, queryset):
+        ''' The async counterpart of _export_lines() '''
+        serializer = self.get_serializer()
+        async for recipe in queryset.aiterator(
+                chunk_size=settings.RECIPE_EXPORT_CHUNK_SIZE):
+            yield renderer.render_line(serializer.to_representation(recipe))
+
+    @action(methods=['GET'], detail=False)
+    def facets(self, request):
+        """Count the recipes per tag and ingredient under the filters.
+
+        Both relations are counted by one grouped query over the through
+        tables. Without filters the counts are read from the maintained
+        recipe_count columns instead. Responses are cached per user data
+        version like the list.
+        """
+        return self._get_cached_response(request, self._facets)
+
+    def _facets(self, request):
+        ''' Build the facet counts of the current filters '''
+        filtered = any(
+            request.query_params.get(name)
+            for name in ('tags', 'ingredients', 'search', *self.range_filters)
+        )
+        if filtered:
+            counts = self.get_queryset().facet_counts('tags', 'ingredients')
+        else:
+            # Unfiltered counts are the maintained recipe_count columns.
+            counts = [
+                model.objects.filter(
+                    user=request.user, recipe_count__gt=0
+                ).annotate(
+                    count=F('recipe_count'), facet=Value(facet)
+                ).values_list('facet', 'id', 'name', 'count').order_by()
+                for facet, model in (
+                    ('tags', Tag), ('ingredients', Ingredient)
+                )
+            ]
+            counts = counts[0].union(counts[1], all=True)
+        facets = {'tags': [], 'ingredients': []}
+        for facet, pk, name, count in counts.order_by('-count', 'name', 'id'):
+            facets[facet].append({'id': pk, 'name': name, 'count': count})
+        serializer = self.get_serializer(facets)
+        return Response(serializer.data)
+
+    @action(methods=['POST'], detail=False)
+    def bulk(self, request):
+        ''' Create many recipes in one transaction
+
+        Errors are reported as a list with one entry per submitted recipe,
+        nothing is saved unless every recipe is valid.
+        '''
+        serializer = self.get_serializer(
+            data=request.data, many=True, allow_empty=False,
+            max_length=settings.RECIPE_BULK_MAX_ITEMS,
+        )
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors, status=status.HTTP_400_BAD_REQUEST
+            )
+        recipes = serializer.save()
+        # Read the links back in one query per relation for the response.
+        created = self.queryset.prefetch_related(
+            *self._get_prefetches()
+        ).in_bulk([recipe.pk for recipe in recipes])
+        serializer = self.get_serializer(
+            [created[recipe.pk] for recipe in recipes], many=True
+        )
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
     @action(methods=['POST'], detail=True, url_path='upload_image')
     def upload_image(self, request, pk=None):
         ''' Upload the image to recipe '''
         recipe = self.get_object()
+        if bool(int(request.query_params.get('async', 0))):
+            return self._queue_image(request, recipe)
+        previous_image = recipe.image.name
         serializer = self.get_serializer(recipe, data=request.data)
         if serializer.is_valid():
             serializer.save()
+            # Encoding every width and format would pin the worker.
+            queue_variants(recipe.image.name)
+            if previous_image != recipe.image.name:
+                release_image_on_commit(previous_image)
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    def _queue_image(self, request, recipe):
+        ''' Store the raw upload for the background worker '''
+        serializer = serializers.RecipeImageUploadSerializer(
+            data=request.data, context=self.get_serializer_context()
+        )
+        if serializer.is_valid():
+            serializer.save(user=request.user, recipe=recipe)
+            return Response(
+                serializer.data,
+                status=status.HTTP_202_ACCEPTED,
+                headers={'Location': serializer.data['status_url']},
+            )
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class RecipeImageUploadViewSet(
+        mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    ''' Report the processing status of queued recipe images '''
+    serializer_class = serializers.RecipeImageUploadSerializer
+    queryset = RecipeImageUpload.objects.all()
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        ''' Retrieve uploads for the authenticated user '''
+        return self.queryset.filter(user=self.request.user)
+
 
 class TagViewSet(BaseRecipeAttrViewSet):
     ''' Manage tags in the database '''
@@ -125,3 +546,25 @@ class IngredientViewSet(BaseRecipeAttrViewSet):
     ''' Manage the ingredients in the database '''
     serializer_class = serializers.IngredientSerializer
     queryset = Ingredient.objects.all()
+
+
+class ResponseCacheStatsView(APIView):
+    ''' Report the list response cache hit ratio and bytes served '''
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(responses=OpenApiTypes.OBJECT)
+    def get(self, request):
+        ''' Return the shared cache counters '''
+        return Response(get_stats())
+
+
+class DatabaseStatsView(APIView):
+    ''' Report how database connections are reused and pooled '''
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(responses=OpenApiTypes.OBJECT)
+    def get(self, request):
+        ''' Return the connection settings and counters '''
+        return Response(get_database_stats())
@@ -0,0 +1,2 @@
+uwsgi_pass          ${APP_HOST}:${APP_PORT};
+include             /etc/nginx/uwsgi_params;
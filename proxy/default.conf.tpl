@@ -1,12 +1,34 @@
+# Recipe image variants are stored as <width>.jpg with optional .avif and
+# .webp siblings, serve the best format the client accepts.
+map $http_accept $avif_suffix {
+    default "";
+    "~*image/avif" ".avif";
+}
+
+map $http_accept $webp_suffix {
+    default "";
+    "~*image/webp" ".webp";
+}
+
 server {
     listen ${LISTEN_PORT};
 
+    # Recipe image names are derived from their content and never change.
+    location /static/media/uploads/recipe/variants/ {
+        root /vol;
+        add_header Vary Accept;
+        add_header Cache-Control "public, max-age=31536000, immutable";
+        try_files $uri$avif_suffix $uri$webp_suffix $uri =404;
+    }
+    location /static/media/uploads/recipe/ {
+        root /vol;
+        add_header Cache-Control "public, max-age=31536000, immutable";
+    }
     location /static {
         alias /vol/static;
     }
     location / {
-        uwsgi_pass          ${APP_HOST}:${APP_PORT};
-        include             /etc/nginx/uwsgi_params;
+        include             /etc/nginx/app.conf;
         client_max_body_size  10M;
     }
-}
\ No newline at end of file
+}
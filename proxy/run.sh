@@ -2,5 +2,8 @@
 
 set -e
 
-envsubst < /etc/nginx/default.conf.tpl > /etc/nginx/conf.d/default.conf
+envsubst '${LISTEN_PORT} ${APP_HOST} ${APP_PORT}' \
+    < /etc/nginx/default.conf.tpl > /etc/nginx/conf.d/default.conf
+envsubst '${APP_HOST} ${APP_PORT}' \
+    < /etc/nginx/app_${SERVER_MODE}.conf.tpl > /etc/nginx/app.conf
 nginx -g 'daemon off;'
\ No newline at end of file
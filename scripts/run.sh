@@ -6,4 +6,16 @@ python manage.py wait_for_db
 python  manage.py collectstatic --noinput
 python manage.py migrate
 
-uwsgi --socket :9000 --workers 4 --master --enable-threads --module app.wsgi
+if [ "${SERVER_MODE:-wsgi}" = "asgi" ]; then
+    # Restart the image worker whenever it exits, as uWSGI's
+    # --attach-daemon does in wsgi mode.
+    while true; do
+        python manage.py process_image_uploads || true
+        sleep 1
+    done &
+    exec uvicorn app.asgi:application --host 0.0.0.0 --port 9000 \
+        --workers "${ASGI_WORKERS:-2}" --no-access-log
+fi
+
+uwsgi --socket :9000 --workers 4 --master --enable-threads --module app.wsgi \
+    --attach-daemon "python manage.py process_image_uploads"